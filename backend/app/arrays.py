@@ -0,0 +1,178 @@
+"""Array (CSR / per-node numpy) helpers working on integer node positions"""
+import math
+import numpy as np
+import networkx as nx
+from scipy.sparse import csr_array
+from scipy.sparse.csgraph import connected_components, dijkstra, shortest_path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app import kernels
+
+EARTH_RADIUS_KM = 6371.009  # same radius as geopy.distance.great_circle
+MISSING_WEIGHT_KM = 99999.0
+# Sources per shortest_path call when measuring a diameter (bounds the distance matrix to chunk x n)
+DIAMETER_SOURCE_CHUNK = 256
+
+
+def great_circle_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km (geopy's formula), vectorised over numpy arrays."""
+    lat1, lon1, lat2, lon2 = (np.radians(x) for x in (lat1, lon1, lat2, lon2))
+    sin_lat1, cos_lat1 = np.sin(lat1), np.cos(lat1)
+    sin_lat2, cos_lat2 = np.sin(lat2), np.cos(lat2)
+    delta_lon = lon2 - lon1
+    cos_delta, sin_delta = np.cos(delta_lon), np.sin(delta_lon)
+    d = np.arctan2(
+        np.sqrt((cos_lat2 * sin_delta) ** 2 + (cos_lat1 * sin_lat2 - sin_lat1 * cos_lat2 * cos_delta) ** 2),
+        sin_lat1 * sin_lat2 + cos_lat1 * cos_lat2 * cos_delta,
+    )
+    return EARTH_RADIUS_KM * d
+
+
+def graph_to_csr(G: nx.Graph, node_index: Dict[int, int]) -> csr_array:
+    """
+    Symmetric CSR adjacency of an undirected graph over the positions in node_index,
+    weighted in km ('weight', else 'distance_km', else great-circle from coordinates).
+    """
+    n = len(node_index)
+    m = G.number_of_edges()
+    rows = np.empty(m, dtype=np.int32)
+    cols = np.empty(m, dtype=np.int32)
+    data = np.empty(m, dtype=np.float64)
+    nodes = G.nodes
+    for k, (u, v, d) in enumerate(G.edges(data=True)):
+        rows[k] = node_index[u]
+        cols[k] = node_index[v]
+        w = d.get("weight", d.get("distance_km"))
+        if w is None:
+            nu, nv = nodes[u], nodes[v]
+            try:
+                w = float(great_circle_km(nu["lat"], nu["lon"], nv["lat"], nv["lon"]))
+            except KeyError:
+                w = MISSING_WEIGHT_KM
+            if not math.isfinite(w):
+                w = MISSING_WEIGHT_KM
+        data[k] = w
+    return csr_array(
+        (np.concatenate([data, data]), (np.concatenate([rows, cols]), np.concatenate([cols, rows]))),
+        shape=(n, n),
+    )
+
+
+def drop_from_csr(
+    A: csr_array,
+    nodes: Iterable[int] = (),
+    edges: Iterable[Tuple[int, int]] = (),
+) -> csr_array:
+    """Copy of A without the entries incident to `nodes` and without `edges` (both directions)."""
+    n = A.shape[0]
+    rows = np.repeat(np.arange(n, dtype=np.int64), np.diff(A.indptr))
+    keep_node = np.ones(n, dtype=bool)
+    keep_node[list(nodes)] = False
+    keep = keep_node[rows] & keep_node[A.indices]
+    edges = list(edges)
+    if edges:
+        pairs = np.asarray(edges, dtype=np.int64)
+        dropped = np.concatenate([pairs[:, 0] * n + pairs[:, 1], pairs[:, 1] * n + pairs[:, 0]])
+        keep &= ~np.isin(rows * n + A.indices, dropped)
+    return csr_array((A.data[keep], (rows[keep], A.indices[keep])), shape=A.shape)
+
+
+def csr_shortest_path(A: csr_array, src: int, dst: int) -> Tuple[Optional[float], List[int]]:
+    """Dijkstra src -> dst on A. Returns (distance, path positions) or (None, []) if unreachable."""
+    dist, pred = dijkstra(A, directed=True, indices=src, return_predecessors=True)
+    if not np.isfinite(dist[dst]):
+        return None, []
+    path = [dst]
+    while path[-1] != src:
+        path.append(int(pred[path[-1]]))
+    path.reverse()
+    return float(dist[dst]), path
+
+
+def adjacency_arrays(G: nx.Graph, nodelist: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Unweighted symmetric CSR structure (indptr, indices) of G over the positions of nodelist."""
+    A = nx.to_scipy_sparse_array(G, nodelist=nodelist, weight=None, format="csr")
+    return A.indptr.astype(np.int32), A.indices.astype(np.int32)
+
+
+def masked_csr(indptr: np.ndarray, indices: np.ndarray, active: np.ndarray) -> csr_array:
+    """Unweighted CSR of the subgraph induced by the positions where active is True (renumbered)."""
+    n = len(indptr) - 1
+    A = csr_array((np.ones(len(indices), dtype=np.int8), indices, indptr), shape=(n, n))
+    keep = np.flatnonzero(active)
+    return A[keep][:, keep]
+
+
+def csr_path_lengths(A: csr_array) -> Tuple[float, float]:
+    """(diameter, average shortest-path length) in hops of a connected CSR graph; (0, 0) below two nodes."""
+    n = A.shape[0]
+    if n < 2:
+        return 0.0, 0.0
+    best = 0.0
+    total = 0.0  # integer hop counts: exact in float64
+    for start in range(0, n, DIAMETER_SOURCE_CHUNK):
+        dist = shortest_path(A, directed=False, unweighted=True, indices=np.arange(start, min(start + DIAMETER_SOURCE_CHUNK, n)))
+        best = max(best, float(dist.max()))
+        total += float(dist.sum())
+    return best, total / (n * (n - 1))
+
+
+def masked_lcc_stats(indptr: np.ndarray, indices: np.ndarray, active: np.ndarray, with_aspl: bool = False) -> Dict[str, float]:
+    """
+    Undirected nodes / edges / components / LCC size / LCC diameter of the subgraph induced
+    by `active` -- what get_stats measures, without materialising a NetworkX graph.
+    Ties for the LCC go to the component holding the lowest position (nx.connected_components order).
+    with_aspl adds "aspl", the average shortest-path length within the LCC (offline use:
+    metrics.aspl stays disabled for the API).
+    """
+    if kernels.HAS_NUMBA and not with_aspl:
+        return _masked_lcc_stats_jit(indptr, indices, active)
+    A = masked_csr(indptr, indices, active)
+    n = A.shape[0]
+    if n == 0:
+        stats = {"nodes": 0, "edges": 0, "components": 0, "lcc_size": 0, "diameter": 0.0}
+        if with_aspl:
+            stats["aspl"] = 0.0
+        return stats
+    n_components, labels = connected_components(A, directed=False)
+    sizes = np.bincount(labels)
+    lcc_label = int(np.argmax(sizes))
+    lcc_size = int(sizes[lcc_label])
+    diam, avg = 0.0, 0.0
+    if lcc_size >= 2:
+        lcc = np.flatnonzero(labels == lcc_label)
+        diam, avg = csr_path_lengths(A[lcc][:, lcc])
+    stats = {
+        "nodes": n,
+        "edges": A.nnz // 2,
+        "components": int(n_components),
+        "lcc_size": lcc_size,
+        "diameter": diam,
+    }
+    if with_aspl:
+        stats["aspl"] = avg
+    return stats
+
+
+def _masked_lcc_stats_jit(indptr: np.ndarray, indices: np.ndarray, active: np.ndarray) -> Dict[str, float]:
+    """masked_lcc_stats via the numba kernels: BFS straight over the masked arrays, no sub-CSR."""
+    active = np.asarray(active, dtype=np.bool_)
+    n = int(active.sum())
+    if n == 0:
+        return {"nodes": 0, "edges": 0, "components": 0, "lcc_size": 0, "diameter": 0.0}
+    n_components, labels = kernels.component_labels(indptr, indices, active)
+    sizes = np.bincount(labels[active])
+    lcc_label = int(np.argmax(sizes))
+    lcc_size = int(sizes[lcc_label])
+    diam = 0.0
+    if lcc_size >= 2:
+        lcc = np.flatnonzero(labels == lcc_label).astype(np.int32)
+        diam = float(kernels.max_sp_length(indptr, indices, active, lcc))
+    rows = np.repeat(active, np.diff(indptr))
+    return {
+        "nodes": n,
+        "edges": int(np.count_nonzero(rows & active[indices])) // 2,
+        "components": int(n_components),
+        "lcc_size": lcc_size,
+        "diameter": diam,
+    }
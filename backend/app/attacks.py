@@ -1,20 +1,25 @@
 """Attack strategies - inspired by b4_airline_robustness_nhom3.py"""
 
+import logging
 import networkx as nx
 import numpy as np
 from typing import List, Dict
 
-from app.metrics import get_stats, get_lcc, diameter
+from app.arrays import adjacency_arrays, masked_lcc_stats
+from app.metrics import get_stats, aspl, betweenness as node_betweenness
+from app.defense import DSU
+
+logger = logging.getLogger(__name__)
 
 
 def random_attack(G: nx.Graph, k: int, seed: int = None) -> List[int]:
     """Random node removal."""
-    if seed is not None:
-        np.random.seed(seed)
+    # Local RandomState (same stream as np.random.seed) so concurrent simulations don't share the global RNG
+    rng = np.random.RandomState(seed) if seed is not None else np.random
     nodes = list(G.nodes())
     if len(nodes) == 0:
         return []
-    return np.random.choice(nodes, size=min(k, len(nodes)), replace=False).tolist()
+    return rng.choice(nodes, size=min(k, len(nodes)), replace=False).tolist()
 
 
 def degree_targeted_attack(G: nx.Graph, k: int, adaptive: bool = True) -> List[int]:
@@ -49,7 +54,8 @@ def pagerank_targeted_attack(G: nx.Graph, k: int, adaptive: bool = True) -> List
         if len(G_copy) == 0:
             break
         try:
-            pr = nx.pagerank(G_copy, alpha=0.85)
+            # Unweighted PageRank: the base graph may carry km 'weight' attributes
+            pr = nx.pagerank(G_copy, alpha=0.85, weight=None)
         except Exception:
             # Fallback: degree nếu PageRank không hội tụ
             pr = dict(G_copy.degree())
@@ -75,12 +81,9 @@ def betweenness_targeted_attack(G: nx.Graph, k: int, adaptive: bool = True) -> L
         if len(G_copy) < 2:
             break
         try:
-            # Use approximation for large graphs to speed up
-            if len(G_copy) > 100:
-                sample_size = min(100, len(G_copy))
-                betweenness = nx.betweenness_centrality(G_copy, k=sample_size)
-            else:
-                betweenness = nx.betweenness_centrality(G_copy)
+            # Use approximation for large graphs to speed up (exact when graph-tool is available)
+            sample_size = min(100, len(G_copy)) if len(G_copy) > 100 else None
+            betweenness = node_betweenness(G_copy, k=sample_size)
             if not betweenness:
                 break
             target = max(betweenness.items(), key=lambda x: x[1])[0]
@@ -88,7 +91,7 @@ def betweenness_targeted_attack(G: nx.Graph, k: int, adaptive: bool = True) -> L
             if adaptive:
                 G_copy.remove_node(target)
         except Exception as e:
-            print(f"Error in betweenness_targeted_attack: {e}")
+            logger.warning("Error in betweenness_targeted_attack: %s", e)
             break
 
     return removed
@@ -121,7 +124,8 @@ def simulate_attack(
             - relative_lcc_size
             - diameter
     """
-    if len(G) == 0:
+    original_size = len(G)
+    if original_size == 0:
         return {
             "fraction_removed": [],
             "relative_lcc_size": [],
@@ -132,10 +136,14 @@ def simulate_attack(
     if fractions is None:
         fractions = [round(i * 0.05, 2) for i in range(11)]
 
-    original_size = len(G)
     # IMPORTANT: Normalize LCC size theo số node ban đầu (N0), không phải số node hiện tại
     # Để đảm bảo khi so sánh Original vs Reinforced, cả 2 đều bắt đầu từ 1.0
     N0 = original_size
+
+    # Immutable CSR structure built once per simulation; removals only flip bits in a mask
+    nodes = list(G.nodes())
+    pos = {node: i for i, node in enumerate(nodes)}
+    indptr, indices = adjacency_arrays(G, nodes)
     
     results: Dict[str, list] = {
         "fraction_removed": [],
@@ -150,30 +158,25 @@ def simulate_attack(
 
         for run in range(n_runs):
             run_seed = seed + run if seed is not None else None
-            G_copy = G.copy()
 
             # Pre-select toàn bộ thứ tự xoá node cho run này
-            all_nodes = random_attack(G_copy, original_size, seed=run_seed)
+            all_nodes = random_attack(G, original_size, seed=run_seed)
 
+            active = np.ones(original_size, dtype=bool)
             current_removed = 0
-            local_nodes = list(all_nodes)
             for fraction in fractions:
                 target_removed = int(fraction * original_size)
 
-                # Remove nodes up to target
-                while current_removed < target_removed and local_nodes:
-                    node = local_nodes.pop(0)
-                    if node in G_copy:
-                        G_copy.remove_node(node)
-                        current_removed += 1
+                # Remove nodes up to target (clear their bits in the mask)
+                batch = all_nodes[current_removed:target_removed]
+                if batch:
+                    active[[pos[node] for node in batch]] = False
+                    current_removed += len(batch)
 
                 # Calculate LCC size normalized by N0 (original size), not current size
-                lcc_nodes = get_lcc(G_copy)
-                lcc_size_normalized = len(lcc_nodes) / N0 if N0 > 0 else 0.0
-                diameter_val = diameter(G_copy)
-                
-                all_lcc[fraction].append(lcc_size_normalized)
-                all_diameter[fraction].append(diameter_val)
+                stats = masked_lcc_stats(indptr, indices, active)
+                all_lcc[fraction].append(stats["lcc_size"] / N0 if N0 > 0 else 0.0)
+                all_diameter[fraction].append(stats["diameter"])
 
         # Lấy trung bình
         for fraction in fractions:
@@ -183,38 +186,101 @@ def simulate_attack(
 
     else:
         # Single run cho các chiến lược targeted
-        G_copy = G.copy()
-        current_removed = 0
-
         # Pre-select nodes theo strategy
         if strategy == "random_attack":
-            all_nodes = random_attack(G_copy, original_size, seed=seed)
+            all_nodes = random_attack(G, original_size, seed=seed)
         elif strategy == "degree_targeted_attack":
-            all_nodes = degree_targeted_attack(G_copy, original_size, adaptive=True)
+            all_nodes = degree_targeted_attack(G, original_size, adaptive=True)
         elif strategy == "pagerank_targeted_attack":
-            all_nodes = pagerank_targeted_attack(G_copy, original_size, adaptive=True)
+            all_nodes = pagerank_targeted_attack(G, original_size, adaptive=True)
         elif strategy == "betweenness_targeted_attack":
-            all_nodes = betweenness_targeted_attack(G_copy, original_size, adaptive=True)
+            all_nodes = betweenness_targeted_attack(G, original_size, adaptive=True)
         else:
             all_nodes = []
 
+        active = np.ones(original_size, dtype=bool)
+        current_removed = 0
         for fraction in fractions:
             target_removed = int(fraction * original_size)
 
-            # Remove nodes up to target
-            while current_removed < target_removed and all_nodes:
-                node = all_nodes.pop(0)
-                if node in G_copy:
-                    G_copy.remove_node(node)
-                    current_removed += 1
+            # Remove nodes up to target (clear their bits in the mask)
+            batch = all_nodes[current_removed:target_removed]
+            if batch:
+                active[[pos[node] for node in batch]] = False
+                current_removed += len(batch)
 
             # Calculate LCC size normalized by N0 (original size), not current size
-            lcc_nodes = get_lcc(G_copy)
-            lcc_size_normalized = len(lcc_nodes) / N0 if N0 > 0 else 0.0
-            diameter_val = diameter(G_copy)
-            
+            stats = masked_lcc_stats(indptr, indices, active)
             results["fraction_removed"].append(fraction)
-            results["relative_lcc_size"].append(lcc_size_normalized)
-            results["diameter"].append(diameter_val)
+            results["relative_lcc_size"].append(stats["lcc_size"] / N0 if N0 > 0 else 0.0)
+            results["diameter"].append(stats["diameter"])
 
     return results
+
+
+def sequential_removal_stats(G: nx.Graph, order: List[int]) -> List[Dict]:
+    """
+    get_stats of G after removing order[:s], for s = 1..len(order) (undirected G).
+
+    Computed in reverse: start from G without every node in `order`, add them back one
+    at a time and keep components / edge counts up to date with a DSU instead of a
+    full components scan per step. Diameter is still measured on the current LCC.
+    """
+    nodes = list(G.nodes())
+    pos = {node: i for i, node in enumerate(nodes)}
+    removed = set(order)
+    present = [node not in removed for node in nodes]
+    dsu = DSU(len(nodes))
+    n_nodes = sum(present)
+    n_components = n_nodes
+    n_edges = 0
+    for u, v in G.edges():
+        if u in removed or v in removed:
+            continue
+        n_edges += 1
+        if dsu.find(pos[u]) != dsu.find(pos[v]):
+            dsu.union(pos[u], pos[v])
+            n_components -= 1
+
+    def current_stats() -> Dict:
+        # LCC = first largest component in node order (same tie-break as nx.connected_components + max)
+        lcc_root, lcc_len = None, 0
+        for i in range(len(nodes)):
+            if present[i]:
+                root = dsu.find(i)
+                if dsu.sz[root] > lcc_len:
+                    lcc_root, lcc_len = root, dsu.sz[root]
+        diam = 0.0
+        if lcc_len >= 2:
+            lcc_nodes = [nodes[i] for i in range(len(nodes)) if present[i] and dsu.find(i) == lcc_root]
+            try:
+                diam = float(nx.diameter(G.subgraph(lcc_nodes)))
+            except Exception:
+                diam = 0.0
+        return {
+            "directed": False,
+            "nodes": n_nodes,
+            "edges": n_edges,
+            "lcc_norm": lcc_len / n_nodes if n_nodes else 0.0,
+            "diameter": diam,
+            "aspl": aspl(G),
+            "components": n_components,
+        }
+
+    stats = []
+    for node in reversed(order):
+        stats.append(current_stats())
+        i = pos[node]
+        present[i] = True
+        n_nodes += 1
+        n_components += 1
+        for nbr in G[node]:
+            j = pos[nbr]
+            if not present[j]:
+                continue
+            n_edges += 1
+            if dsu.find(i) != dsu.find(j):
+                dsu.union(i, j)
+                n_components -= 1
+    stats.reverse()
+    return stats
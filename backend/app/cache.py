@@ -0,0 +1,89 @@
+"""Response caching: fastapi-cache2 for the heavy simulation endpoints, ETags for all GETs"""
+import hashlib
+import os
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.state import app_state
+
+CACHE_PREFIX = "social"
+CACHE_EXPIRE_SECONDS = 3600
+
+# graph_version restarts at 0 with the process, so ETags and cache keys also carry a per-process id
+_BOOT_ID = uuid.uuid4().hex
+
+
+def init_cache() -> None:
+    """Initialise the cache backend: in-memory by default, Redis when REDIS_URL is set."""
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url:
+        # Optional: needs the `redis` package installed
+        from redis import asyncio as aioredis
+        from fastapi_cache.backends.redis import RedisBackend
+
+        backend = RedisBackend(aioredis.from_url(redis_url))
+    else:
+        backend = InMemoryBackend()
+    FastAPICache.init(backend, prefix=CACHE_PREFIX)
+
+
+def graph_key_builder(
+    func: Callable[..., Any],
+    namespace: str = "",
+    *,
+    request: Optional[Request] = None,
+    response: Optional[Response] = None,
+    args: Tuple[Any, ...] = (),
+    kwargs: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Cache key = route + query params + app_state.graph_version + _BOOT_ID.
+
+    graph_version is bumped by every remove/restore/reset, so mutations
+    invalidate all cached results without touching the backend. It is per
+    process and restarts with it, so the boot id keeps a shared/persistent
+    backend (Redis) from mixing removal states that reuse a version number.
+    """
+    if request is not None:
+        params = f"{request.url.path}?{sorted(request.query_params.multi_items())}"
+    else:
+        params = repr(sorted((kwargs or {}).items()))
+    raw = f"{func.__module__}:{func.__name__}:{params}:{_BOOT_ID}:{app_state.graph_version}"
+    # namespace already carries the "<prefix>:" part
+    return f"{namespace}:{hashlib.md5(raw.encode()).hexdigest()}"
+
+
+def graph_etag(path: str, query: str) -> str:
+    """Quoted ETag for a GET of path?query at the current graph_version."""
+    raw = f"{_BOOT_ID}|{app_state.graph_version}|{path}|{query}"
+    return f'"{hashlib.blake2b(raw.encode(), digest_size=8).hexdigest()}"'
+
+
+async def etag_middleware(request: Request, call_next):
+    """
+    Conditional GET: answer 304 when If-None-Match matches the ETag for the current
+    graph_version, otherwise tag successful responses so the client can revalidate.
+
+    This is the only ETag/304 mechanism: If-None-Match is stripped before the route
+    runs, so fastapi-cache never answers 304 against its own (replaced) W/ ETags.
+    """
+    if request.method != "GET":
+        return await call_next(request)
+    etag = graph_etag(request.url.path, request.url.query)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    if if_none_match is not None:
+        request.scope["headers"] = [(k, v) for k, v in request.scope["headers"] if k != b"if-none-match"]
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers["ETag"] = etag
+    # Overwrite fastapi-cache's max-age: results change with graph_version at the same URL,
+    # so clients must always revalidate with the server
+    response.headers["Cache-Control"] = "no-cache"
+    return response
@@ -1,4 +1,5 @@
 """Defense strategies using TER (Effective Resistance)"""
+import logging
 import networkx as nx
 import numpy as np
 import random
@@ -7,6 +8,8 @@ from geopy.distance import great_circle
 from scipy.sparse import csr_matrix
 from scipy.sparse.linalg import splu
 
+logger = logging.getLogger(__name__)
+
 
 def _build_grounded_laplacian_lu(G: nx.Graph, node_list: List[Any]) -> Tuple[Dict[Any, int], int, Any, Any]:
     """
@@ -173,7 +176,7 @@ def add_edges_by_effective_resistance(
     except Exception as e:
         # Fallback to simple method if LU factorization fails
         # Return LCC only (matching notebook implementation)
-        print(f"Warning: LU factorization failed, using simple defense: {e}")
+        logger.warning("LU factorization failed, using simple defense: %s", e)
         H_reinforced = reinforce_graph_simple(H, k, max_distance_km)
         # Return LCC with added edges
         added = [(u, v, {"defense": "simple", "backup": True}) 
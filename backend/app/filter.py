@@ -1,5 +1,6 @@
 """Graph filtering utilities"""
 import networkx as nx
+import numpy as np
 from typing import Optional
 import math
 
@@ -40,3 +41,23 @@ def filter_graph_by_bbox(G: nx.Graph, bbox: Optional[dict] = None) -> nx.Graph:
     
     return G_filtered
 
+
+
+def bbox_mask(lat: np.ndarray, lon: np.ndarray, bbox: Optional[dict] = None) -> np.ndarray:
+    """
+    Vectorised counterpart of filter_graph_by_bbox's node test over per-node
+    coordinate arrays: valid (finite, in-range) coordinates inside bbox.
+    """
+    with np.errstate(invalid="ignore"):
+        mask = (lat >= -90) & (lat <= 90) & (lon >= -180) & (lon <= 180)
+        if bbox is None:
+            return mask
+        if bbox.get("minLat") is not None:
+            mask &= lat >= bbox["minLat"]
+        if bbox.get("maxLat") is not None:
+            mask &= lat <= bbox["maxLat"]
+        if bbox.get("minLon") is not None:
+            mask &= lon >= bbox["minLon"]
+        if bbox.get("maxLon") is not None:
+            mask &= lon <= bbox["maxLon"]
+    return mask
@@ -1,23 +1,11 @@
 """Generate GeoJSON"""
 import math
-import networkx as nx
-from typing import Optional
+import orjson
+from typing import Iterable, Iterator, Optional
 
-def to_geojson(G, bbox: Optional[dict] = None, removed_nodes: Optional[set] = None, removed_edges: Optional[set] = None):
-    """Convert graph to GeoJSON with optional bbox filter
-    
-    Args:
-        G: NetworkX graph
-        bbox: Optional dict with keys minLat, maxLat, minLon, maxLon
-        removed_nodes: Set of removed node IDs
-        removed_edges: Set of removed edge tuples (normalized)
-    """
-    import networkx as nx
-    
-    removed_nodes = removed_nodes or set()
-    removed_edges = removed_edges or set()
-    
-    # Extract bbox if provided
+
+def _make_in_bbox(bbox: Optional[dict]):
+    """Build the point-in-bbox predicate used by the feature generators."""
     min_lat = bbox.get("minLat") if bbox is not None else None
     max_lat = bbox.get("maxLat") if bbox is not None else None
     min_lon = bbox.get("minLon") if bbox is not None else None
@@ -37,9 +25,17 @@ def to_geojson(G, bbox: Optional[dict] = None, removed_nodes: Optional[set] = No
             return False
         return True
     
+    return in_bbox
+
+
+def iter_airport_features(G, bbox: Optional[dict] = None, removed_nodes: Optional[set] = None, removed_edges: Optional[set] = None) -> Iterator[dict]:
+    """Yield airport Point features (airports with at least one non-removed route, inside bbox)"""
+    removed_nodes = removed_nodes or set()
+    removed_edges = removed_edges or set()
+    in_bbox = _make_in_bbox(bbox)
+    
     # Nodes - sample airports (tối ưu: chỉ lấy airports có routes)
     # Tính nodes_with_routes từ các edges KHÔNG bị removed
-    nodes = []
     nodes_with_routes = set()
     for src, dst in G.edges():
         # Chỉ thêm nodes nếu cả hai đều không bị removed và edge không bị removed
@@ -60,7 +56,7 @@ def to_geojson(G, bbox: Optional[dict] = None, removed_nodes: Optional[set] = No
             if (not math.isnan(lat) and not math.isnan(lon) and
                 -90 <= lat <= 90 and -180 <= lon <= 180 and
                 in_bbox(lat, lon)):  # Filter by bbox
-                nodes.append({
+                yield {
                     "type": "Feature",
                     "geometry": {"type": "Point", "coordinates": [lon, lat]},
                     "properties": {
@@ -71,13 +67,17 @@ def to_geojson(G, bbox: Optional[dict] = None, removed_nodes: Optional[set] = No
                         "iata": str(data.get("iata", "")),
                         "icao": str(data.get("icao", ""))
                     }
-                })
+                }
+
+
+def iter_route_features(G, bbox: Optional[dict] = None, removed_nodes: Optional[set] = None, removed_edges: Optional[set] = None) -> Iterator[dict]:
+    """Yield route LineString features (non-removed routes with at least one endpoint in bbox)"""
+    removed_nodes = removed_nodes or set()
+    removed_edges = removed_edges or set()
+    in_bbox = _make_in_bbox(bbox)
     
     # Edges - lấy full routes từ data ban đầu
-    edges = []
-    edge_list = list(G.edges(data=True))
-    
-    for src, dst, data in edge_list:
+    for src, dst, data in G.edges(data=True):
         # Bỏ qua edge nếu một trong hai node đã bị removed
         if src in removed_nodes or dst in removed_nodes:
             continue
@@ -99,7 +99,7 @@ def to_geojson(G, bbox: Optional[dict] = None, removed_nodes: Optional[set] = No
                     if edge_tuple in removed_edges:
                         continue
                     
-                    edges.append({
+                    yield {
                         "type": "Feature",
                         "geometry": {
                             "type": "LineString",
@@ -109,7 +109,36 @@ def to_geojson(G, bbox: Optional[dict] = None, removed_nodes: Optional[set] = No
                             "source": int(src),
                             "target": int(dst)
                         }
-                    })
+                    }
+
+
+def stream_feature_collection(features: Iterable[dict], chunk_size: int = 1000) -> Iterator[bytes]:
+    """Serialise features with orjson as a FeatureCollection, yielding bytes in chunks of chunk_size features"""
+    yield b'{"type":"FeatureCollection","features":['
+    sep = b""
+    batch = []
+    for feature in features:
+        batch.append(orjson.dumps(feature))
+        if len(batch) >= chunk_size:
+            yield sep + b",".join(batch)
+            sep = b","
+            batch = []
+    if batch:
+        yield sep + b",".join(batch)
+    yield b"]}"
+
+
+def to_geojson(G, bbox: Optional[dict] = None, removed_nodes: Optional[set] = None, removed_edges: Optional[set] = None):
+    """Convert graph to GeoJSON with optional bbox filter
+    
+    Args:
+        G: NetworkX graph
+        bbox: Optional dict with keys minLat, maxLat, minLon, maxLon
+        removed_nodes: Set of removed node IDs
+        removed_edges: Set of removed edge tuples (normalized)
+    """
+    nodes = list(iter_airport_features(G, bbox, removed_nodes, removed_edges))
+    edges = list(iter_route_features(G, bbox, removed_nodes, removed_edges))
     
     return {
         "airports": {"type": "FeatureCollection", "features": nodes},
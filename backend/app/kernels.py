@@ -0,0 +1,91 @@
+"""Optional numba kernels over CSR arrays (indptr, indices) with an active-node mask.
+
+Used by metrics.get_stats and arrays.masked_lcc_stats when numba is installed;
+without it those fall back to NetworkX / scipy.sparse.csgraph.
+"""
+import numpy as np
+
+try:  # optional JIT backend (pip install numba)
+    from numba import njit
+except ImportError:  # pragma: no cover - depends on environment
+    njit = None
+
+HAS_NUMBA = njit is not None
+
+__all__ = ["HAS_NUMBA", "component_labels", "max_sp_length", "warm_up"]
+
+
+if HAS_NUMBA:
+
+    @njit(cache=True)
+    def component_labels(indptr, indices, active):
+        """
+        Connected-component label per position (-1 for inactive), numbered in order of
+        each component's lowest position -- the order nx.connected_components yields them.
+        Returns (n_components, labels).
+        """
+        n = len(indptr) - 1
+        labels = np.full(n, -1, dtype=np.int32)
+        queue = np.empty(n, dtype=np.int32)
+        n_components = 0
+        for start in range(n):
+            if not active[start] or labels[start] != -1:
+                continue
+            labels[start] = n_components
+            head, tail = 0, 1
+            queue[0] = start
+            while head < tail:
+                u = queue[head]
+                head += 1
+                for k in range(indptr[u], indptr[u + 1]):
+                    v = indices[k]
+                    if active[v] and labels[v] == -1:
+                        labels[v] = n_components
+                        queue[tail] = v
+                        tail += 1
+            n_components += 1
+        return n_components, labels
+
+    @njit(cache=True)
+    def max_sp_length(indptr, indices, active, sources):
+        """
+        Largest hop distance reachable from any of `sources` over active positions
+        (one BFS per source, reusing the dist/queue buffers). Serial on purpose: the API
+        already runs simulations concurrently on its thread pool.
+        """
+        n = len(indptr) - 1
+        dist = np.full(n, -1, dtype=np.int32)
+        queue = np.empty(n, dtype=np.int32)
+        best = 0
+        for s in range(len(sources)):
+            dist[sources[s]] = 0
+            queue[0] = sources[s]
+            head, tail = 0, 1
+            while head < tail:
+                u = queue[head]
+                head += 1
+                for k in range(indptr[u], indptr[u + 1]):
+                    v = indices[k]
+                    if active[v] and dist[v] == -1:
+                        dist[v] = dist[u] + 1
+                        queue[tail] = v
+                        tail += 1
+            best = max(best, dist[queue[tail - 1]])
+            for i in range(tail):
+                dist[queue[i]] = -1
+        return best
+
+else:
+    component_labels = None
+    max_sp_length = None
+
+
+def warm_up() -> None:
+    """Compile (or load from numba's on-disk cache) every kernel on a tiny graph, so requests don't pay for it."""
+    if not HAS_NUMBA:
+        return
+    indptr = np.array([0, 1, 2], dtype=np.int32)
+    indices = np.array([1, 0], dtype=np.int32)
+    active = np.ones(2, dtype=np.bool_)
+    component_labels(indptr, indices, active)
+    max_sp_length(indptr, indices, active, np.arange(2, dtype=np.int32))
@@ -1,10 +1,18 @@
 """Load OpenFlights data"""
+import hashlib
+import logging
+import pickle
 import pandas as pd
 import networkx as nx
 import os
 from geopy.distance import great_circle
 import math
 
+logger = logging.getLogger(__name__)
+
+# Built graph pickled here, keyed by the source files' paths, mtimes and sizes
+GRAPH_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "social_graph.pkl")
+
 def load_airports(path: str) -> pd.DataFrame:
     """Load airports.dat"""
     cols = ["id", "name", "city", "country", "iata", "icao", 
@@ -46,13 +54,13 @@ def load_routes(path: str) -> pd.DataFrame:
 
 def load_and_build_graph(airports_path: str, routes_path: str) -> nx.Graph:
     """Load data and build graph"""
-    print(f"Loading airports from: {airports_path}")
+    logger.info("Loading airports from: %s", airports_path)
     airports = load_airports(airports_path)
-    print(f"Loaded {len(airports)} airports")
+    logger.info("Loaded %d airports", len(airports))
     
-    print(f"Loading routes from: {routes_path}")
+    logger.info("Loading routes from: %s", routes_path)
     routes = load_routes(routes_path)
-    print(f"Loaded {len(routes)} routes")
+    logger.info("Loaded %d routes", len(routes))
     
     # Build graph
     G = nx.Graph()
@@ -94,3 +102,82 @@ def load_and_build_graph(airports_path: str, routes_path: str) -> nx.Graph:
     
     return G
 
+
+def _source_key(airports_path: str, routes_path: str) -> tuple:
+    """
+    Identity of the build: the input files plus this module's source (how the graph is
+    built) and the NetworkX version (how it is pickled). A change to any invalidates the cache.
+    """
+    with open(__file__, "rb") as f:
+        key = [hashlib.sha256(f.read()).hexdigest(), nx.__version__]
+    for path in (airports_path, routes_path):
+        st = os.stat(path)
+        key.append((os.path.abspath(path), st.st_mtime_ns, st.st_size))
+    return tuple(key)
+
+
+def load_graph_cached(airports_path: str, routes_path: str, cache_path: str = GRAPH_CACHE_PATH) -> nx.Graph:
+    """load_and_build_graph, reusing a pickle of the last build while the source files are unchanged"""
+    key = _source_key(airports_path, routes_path)
+    try:
+        with open(cache_path, "rb") as f:
+            cached_key, G = pickle.load(f)
+        if cached_key == key:
+            logger.info("Loaded graph from cache: %s", cache_path)
+            return G
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning("Ignoring unreadable graph cache %s: %s", cache_path, e)
+
+    G = load_and_build_graph(airports_path, routes_path)
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump((key, G), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        finally:
+            # Only left behind when dump/replace failed
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    except Exception as e:
+        logger.warning("Could not write graph cache %s: %s", cache_path, e)
+    return G
+
+
+def ensure_edge_weights(G: nx.Graph, force: bool = False) -> nx.Graph:
+    """
+    Đảm bảo tất cả edges có trọng số 'weight' (khoảng cách km).
+    Nếu chưa có, tính từ distance_km hoặc từ tọa độ.
+
+    Graph đã xử lý được đánh dấu G.graph["_weights_ensured"] (cờ đi theo .copy()),
+    các lần gọi sau bỏ qua vòng lặp O(E). Dùng force=True cho graph đã được thêm/đổi cạnh.
+    """
+    if G.graph.get("_weights_ensured") and not force:
+        return G
+
+    
+    for u, v, data in G.edges(data=True):
+        if "weight" not in data:
+            # Thử dùng distance_km nếu có
+            if "distance_km" in data and data["distance_km"] is not None:
+                data["weight"] = float(data["distance_km"])
+            else:
+                # Tính từ tọa độ
+                u_data = G.nodes[u]
+                v_data = G.nodes[v]
+                if "lat" in u_data and "lon" in u_data and "lat" in v_data and "lon" in v_data:
+                    try:
+                        dist = great_circle(
+                            (u_data["lat"], u_data["lon"]),
+                            (v_data["lat"], v_data["lon"])
+                        ).kilometers
+                        data["weight"] = dist
+                    except:
+                        data["weight"] = 99999.0
+                else:
+                    data["weight"] = 99999.0
+    G.graph["_weights_ensured"] = True
+    return G
@@ -4,15 +4,23 @@ FastAPI Backend for Airline Network Robustness Analysis
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.routes import router
-from app.state import load_data_on_startup
+from app.state import load_data_on_startup, load_precomputed_on_startup
+from app.cache import etag_middleware, init_cache
+import logging
 import os
 
+# App loggers: INFO by default (startup/load messages); LOG_LEVEL=DEBUG enables per-request tracing
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(levelname)s:%(name)s: %(message)s")
+
 app = FastAPI(
     title="Airline Network Robustness API",
     version="1.0.0",
     description="Analyze airline network robustness under various attack scenarios"
 )
 
+# ETag / 304 on GETs (registered before CORS so CORS stays the outer layer)
+app.middleware("http")(etag_middleware)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -26,8 +34,10 @@ app.include_router(router)
 
 @app.on_event("startup")
 async def startup():
-    """Load data on startup"""
+    """Init response cache and load data on startup"""
+    init_cache()
     load_data_on_startup()
+    load_precomputed_on_startup()
 
 @app.get("/")
 async def root():
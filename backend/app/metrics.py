@@ -10,10 +10,27 @@ responsive.  (ASPL is hard-disabled for performance.)
 """
 from __future__ import annotations
 
-from typing import Set
+from typing import Dict, Optional, Set
 import networkx as nx
+import numpy as np
+
+from app.arrays import adjacency_arrays, masked_lcc_stats
+from app.kernels import HAS_NUMBA
+
+try:  # optional C++/OpenMP betweenness backend (conda install -c conda-forge graph-tool)
+    import graph_tool.all as gt
+except ImportError:  # pragma: no cover - depends on environment
+    gt = None
+
+HAS_GRAPH_TOOL = gt is not None
+
+# Node-count gates for betweenness: pure-Python Brandes is only affordable on small graphs
+EXACT_BETWEENNESS_MAX_NODES = 20000 if HAS_GRAPH_TOOL else 50
+BETWEENNESS_ATTACK_MAX_NODES = 2000 if HAS_GRAPH_TOOL else 200
 
 __all__ = [
+    "HAS_GRAPH_TOOL",
+    "betweenness",
     "get_lcc",
     "lcc_size",
     "diameter",
@@ -55,9 +72,8 @@ def lcc_size(G: nx.Graph) -> float:
     return len(_largest_component_nodes(G)) / len(G)
 
 
-def diameter(G: nx.Graph) -> float:
-    """Diameter measured on the largest component (0 if not applicable)."""
-    nodes = _largest_component_nodes(G)
+def _component_diameter(G: nx.Graph, nodes: Set[int]) -> float:
+    """Diameter of G restricted to the (strongly) connected node set *nodes*."""
     if len(nodes) < 2:
         return 0.0
 
@@ -69,6 +85,28 @@ def diameter(G: nx.Graph) -> float:
         return 0.0
 
 
+def diameter(G: nx.Graph) -> float:
+    """Diameter measured on the largest component (0 if not applicable)."""
+    return _component_diameter(G, _largest_component_nodes(G))
+
+
+def betweenness(G: nx.Graph, k: Optional[int] = None) -> Dict[int, float]:
+    """
+    Normalised node betweenness (same scale as nx.betweenness_centrality).
+    Exact via graph-tool when installed (k is ignored); otherwise NetworkX,
+    sampling k sources when k is given.
+    """
+    if gt is None or len(G) <= 2:
+        return nx.betweenness_centrality(G, k=k)
+    nodes = list(G.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    g = gt.Graph(directed=G.is_directed())
+    g.add_vertex(len(nodes))
+    g.add_edge_list([(index[u], index[v]) for u, v in G.edges() if u != v])
+    vertex_betweenness, _ = gt.betweenness(g)
+    return dict(zip(nodes, vertex_betweenness.a.tolist()))
+
+
 def aspl(_: nx.Graph) -> float:  # noqa: D401 – intentionally simple stub
     """Average shortest-path length – **disabled** to keep API fast."""
     return 0.0
@@ -86,12 +124,30 @@ def components_count(G: nx.Graph) -> int:
 
 def get_stats(G: nx.Graph) -> dict:
     """Return minimal set of metrics used by API / visualisations."""
+    # len() is O(V) on subgraph views: count once
+    n_nodes = len(G)
+    if HAS_NUMBA and not G.is_directed() and n_nodes > 0:
+        # JIT BFS over a CSR snapshot (same LCC tie-break as nx.connected_components)
+        nodes = list(G.nodes())
+        indptr, indices = adjacency_arrays(G, nodes)
+        stats = masked_lcc_stats(indptr, indices, np.ones(n_nodes, dtype=bool))
+        return {
+            "directed": False,
+            "nodes": stats["nodes"],
+            "edges": G.number_of_edges(),
+            "lcc_norm": stats["lcc_size"] / stats["nodes"],
+            "diameter": stats["diameter"],
+            "aspl": aspl(G),
+            "components": stats["components"],
+        }
+    # One component scan feeds both lcc_norm and diameter
+    lcc = _largest_component_nodes(G)
     return {
         "directed": G.is_directed(),
-        "nodes": len(G),
+        "nodes": n_nodes,
         "edges": G.number_of_edges(),
-        "lcc_norm": lcc_size(G),
-        "diameter": diameter(G),
+        "lcc_norm": len(lcc) / n_nodes if n_nodes else 0.0,
+        "diameter": _component_diameter(G, lcc),
         "aspl": aspl(G),
         "components": components_count(G),
     }
@@ -0,0 +1,93 @@
+"""Pre-computed attack results on disk: one .npz of curves per region plus a small JSON index"""
+import logging
+import os
+from typing import Dict, List
+
+import numpy as np
+import orjson
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "precomputed_index.json"
+LEGACY_FILE = "precomputed_attacks.json"  # single indented JSON written by older precompute_attacks.py
+STRATEGIES = ("random", "degree", "betweenness")
+
+# Column order of the per-strategy curve arrays (one row per removal step)
+CURVE_FIELDS = ("step", "removed", "fraction_removed", "nodes", "edges", "lcc_norm", "diameter", "aspl", "components")
+# Counts and hop diameters are integral; float64 storage would otherwise turn 6 into 6.0
+_INT_FIELDS = frozenset(("step", "removed", "nodes", "edges", "diameter", "components"))
+
+
+def region_file(region_key: str) -> str:
+    return f"precomputed_attacks_{region_key}.npz"
+
+
+def curve_to_array(curve: List[dict]) -> np.ndarray:
+    """Curve points -> float64 array (len(curve), len(CURVE_FIELDS)); missing fields become NaN."""
+    arr = np.full((len(curve), len(CURVE_FIELDS)), np.nan)
+    for i, point in enumerate(curve):
+        for j, field in enumerate(CURVE_FIELDS):
+            value = point.get(field)
+            if value is not None:
+                arr[i, j] = value
+    return arr
+
+
+def array_to_curve(arr: np.ndarray) -> List[dict]:
+    """Inverse of curve_to_array (NaN fields are dropped, count fields come back as int)."""
+    curve = []
+    for row in arr.tolist():
+        point = {}
+        for field, value in zip(CURVE_FIELDS, row):
+            if value != value:  # NaN
+                continue
+            point[field] = int(value) if field in _INT_FIELDS else value
+        curve.append(point)
+    return curve
+
+
+def save_region(out_dir: str, result: dict) -> dict:
+    """Write one region's curves to its .npz; returns the index entry (metadata + file name)."""
+    filename = region_file(result["region"])
+    np.savez_compressed(
+        os.path.join(out_dir, filename),
+        **{strategy: curve_to_array(result.get(strategy) or []) for strategy in STRATEGIES},
+    )
+    return {
+        "region": result["region"],
+        "region_name": result["region_name"],
+        "baseline": result["baseline"],
+        "k": result["k"],
+        "file": filename,
+    }
+
+
+def save_index(out_dir: str, index: Dict[str, dict]) -> None:
+    # Indented for hand inspection (the file is a few KB); numpy scalars serialise natively
+    with open(os.path.join(out_dir, INDEX_FILE), "wb") as f:
+        f.write(orjson.dumps(index, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+
+
+def load_all(data_dir: str) -> Dict[str, dict]:
+    """
+    Region key -> result dict (same shape precompute_region returns). Reads the index and
+    .npz files when present, else the legacy precomputed_attacks.json; empty if neither exists.
+    """
+    index_path = os.path.join(data_dir, INDEX_FILE)
+    if os.path.exists(index_path):
+        with open(index_path, "rb") as f:
+            index = orjson.loads(f.read())
+        results = {}
+        for region_key, entry in index.items():
+            with np.load(os.path.join(data_dir, entry["file"])) as curves:
+                result = {key: value for key, value in entry.items() if key != "file"}
+                for strategy in STRATEGIES:
+                    result[strategy] = array_to_curve(curves[strategy]) if strategy in curves else []
+            results[region_key] = result
+        return results
+
+    legacy_path = os.path.join(data_dir, LEGACY_FILE)
+    if os.path.exists(legacy_path):
+        with open(legacy_path, "rb") as f:
+            return orjson.loads(f.read())
+    return {}
@@ -1,14 +1,24 @@
 """API routes"""
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from fastapi_cache.decorator import cache
 from pydantic import BaseModel
-from typing import Optional, List
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import Optional, List, Tuple
 
 import networkx as nx  # Needed for type hints and graph operations in helper functions
+import numpy as np
+from scipy.sparse.csgraph import connected_components
 
 from app.state import app_state
-from app.metrics import get_stats
+from app.metrics import BETWEENNESS_ATTACK_MAX_NODES, EXACT_BETWEENNESS_MAX_NODES, betweenness, get_stats
 from app.attacks import (
     simulate_attack,
+    sequential_removal_stats,
     random_attack,
     degree_targeted_attack,
     betweenness_targeted_attack,
@@ -19,11 +29,52 @@ from app.defense import (
     add_edges_by_effective_resistance,
     reinforce_graph_schneider,
 )
-from app.geojson import to_geojson
+from app.geojson import iter_airport_features, iter_route_features, stream_feature_collection
 from app.redundancy import suggest_redundancy
-from app.filter import filter_graph_by_bbox
+from app.filter import bbox_mask
+from app.loader import ensure_edge_weights
+from app.arrays import csr_shortest_path, drop_from_csr, graph_to_csr, great_circle_km
+from app.cache import CACHE_EXPIRE_SECONDS, graph_key_builder
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
+logger = logging.getLogger(__name__)
+
+# Worker threads for independent attack simulations within one request
+SIM_POOL = ThreadPoolExecutor(max_workers=4)
+
+
+# (minLat, maxLat, minLon, maxLon); hashable so it doubles as a cache key
+BBox = Tuple[Optional[float], Optional[float], Optional[float], Optional[float]]
+SEA_BBOX: BBox = (-10, 30, 90, 150)  # default region: Southeast Asia
+_BBOX_KEYS = ("minLat", "maxLat", "minLon", "maxLon")
+
+
+def parse_bbox(
+    minLat: Optional[float] = Query(None),
+    maxLat: Optional[float] = Query(None),
+    minLon: Optional[float] = Query(None),
+    maxLon: Optional[float] = Query(None),
+) -> Optional[BBox]:
+    """
+    Shared bbox query params -> (minLat, maxLat, minLon, maxLon), or None when none is given.
+    Explicit None check: 0 (equator / prime meridian) is a valid bound.
+    """
+    bbox = (minLat, maxLat, minLon, maxLon)
+    if bbox == (None, None, None, None):
+        return None
+    return bbox
+
+
+def _bbox_dict(bbox: Optional[BBox]) -> Optional[dict]:
+    """bbox tuple -> {"minLat": ..., ...} dict used by filter/geojson helpers."""
+    if bbox is None:
+        return None
+    return dict(zip(_BBOX_KEYS, bbox))
+
+
+def _in_pool(fn, *args, **kwargs):
+    """Run fn(*args, **kwargs) on SIM_POOL; returns an awaitable future."""
+    return asyncio.get_running_loop().run_in_executor(SIM_POOL, partial(fn, *args, **kwargs))
 
 class SimulateRequest(BaseModel):
     strategy: str  # random, degree, betweenness
@@ -41,67 +92,42 @@ async def graph_stats():
 @router.get("/geojson/airports")
 async def get_airports(
     mode: str = Query("undirected", description="Graph mode: undirected or directed"),
-    minLat: Optional[float] = Query(None),
-    maxLat: Optional[float] = Query(None),
-    minLon: Optional[float] = Query(None),
-    maxLon: Optional[float] = Query(None)
+    bbox: Optional[BBox] = Depends(parse_bbox),
 ):
     """Get airports GeoJSON with optional bbox filter"""
     if app_state.graph_undirected is None:
         raise HTTPException(400, "Graph not loaded")
     
-    bbox = None
-    if any([minLat, maxLat, minLon, maxLon]):
-        bbox = {
-            "minLat": minLat,
-            "maxLat": maxLat,
-            "minLon": minLon,
-            "maxLon": maxLon
-        }
-    
-    geojson = to_geojson(
-        app_state.graph, 
-        bbox=bbox,
-        removed_nodes=app_state.removed_nodes,
-        removed_edges=app_state.removed_edges
+    # Stream orjson-encoded features; snapshot removals so a concurrent mutation can't change them mid-stream
+    features = iter_airport_features(
+        app_state.graph,
+        bbox=_bbox_dict(bbox),
+        removed_nodes=set(app_state.removed_nodes),
+        removed_edges=set(app_state.removed_edges)
     )
-    return geojson["airports"]
+    return StreamingResponse(stream_feature_collection(features), media_type="application/geo+json")
 
 @router.get("/geojson/routes")
 async def get_routes(
-    minLat: Optional[float] = Query(None),
-    maxLat: Optional[float] = Query(None),
-    minLon: Optional[float] = Query(None),
-    maxLon: Optional[float] = Query(None)
+    bbox: Optional[BBox] = Depends(parse_bbox),
 ):
     """Get routes GeoJSON with optional bbox filter"""
     if app_state.graph_undirected is None:
         raise HTTPException(400, "Graph not loaded")
     
-    bbox = None
-    if any([minLat, maxLat, minLon, maxLon]):
-        bbox = {
-            "minLat": minLat,
-            "maxLat": maxLat,
-            "minLon": minLon,
-            "maxLon": maxLon
-        }
-    
-    geojson = to_geojson(
+    # Stream orjson-encoded features; snapshot removals so a concurrent mutation can't change them mid-stream
+    features = iter_route_features(
         app_state.graph,
-        bbox=bbox,
-        removed_nodes=app_state.removed_nodes,
-        removed_edges=app_state.removed_edges
+        bbox=_bbox_dict(bbox),
+        removed_nodes=set(app_state.removed_nodes),
+        removed_edges=set(app_state.removed_edges)
     )
-    return geojson["routes"]
+    return StreamingResponse(stream_feature_collection(features), media_type="application/geo+json")
 
 
 @router.get("/airports/list")
 async def list_airports(
-    minLat: Optional[float] = Query(None),
-    maxLat: Optional[float] = Query(None),
-    minLon: Optional[float] = Query(None),
-    maxLon: Optional[float] = Query(None),
+    bbox: Optional[BBox] = Depends(parse_bbox),
 ):
     """
     Danh sách sân bay (dùng cho dropdown chọn sân bay trong FE).
@@ -111,66 +137,29 @@ async def list_airports(
     if app_state.graph_undirected is None:
         raise HTTPException(400, "Graph not loaded")
 
-    G = app_state.get_active_graph()
-    if G is None:
-        raise HTTPException(400, "Graph not loaded")
+    # Mask trên mảng SoA dựng sẵn lúc load (đã bỏ NaN/inf và chuẩn hoá text một lần)
+    mask = app_state.active_node_mask()
+    if bbox is not None:
+        mask &= bbox_mask(app_state.node_lat_exact, app_state.node_lon_exact, _bbox_dict(bbox))
 
-    # Filter by bbox if provided
-    from app.filter import filter_graph_by_bbox
-    import math
-
-    bbox = None
-    if any([minLat, maxLat, minLon, maxLon]):
-        bbox = {
-            "minLat": minLat,
-            "maxLat": maxLat,
-            "minLon": minLon,
-            "maxLon": maxLon,
+    ids = app_state.node_ids
+    names, cities, countries = app_state.out_name, app_state.out_city, app_state.out_country
+    iatas, lats, lons = app_state.out_iata, app_state.out_lat, app_state.out_lon
+    airports = [
+        {
+            "id": int(ids[i]),
+            "name": names[i],
+            "city": cities[i],
+            "country": countries[i],
+            "iata": iatas[i],
+            "lat": lats[i],
+            "lon": lons[i],
         }
-        G = filter_graph_by_bbox(G, bbox)
-
-    airports = []
-    for node_id, data in G.nodes(data=True):
-        lat = data.get("lat")
-        lon = data.get("lon")
-        # Đảm bảo lat/lon là số hữu hạn để JSON không lỗi (NaN/inf -> None)
-        if isinstance(lat, (int, float)) and math.isfinite(lat):
-            safe_lat = float(lat)
-        else:
-            safe_lat = None
-        if isinstance(lon, (int, float)) and math.isfinite(lon):
-            safe_lon = float(lon)
-        else:
-            safe_lon = None
-
-        # Các trường text có thể là NaN (float) -> convert an toàn sang chuỗi hoặc rỗng
-        name = data.get("name", "")
-        city = data.get("city", "")
-        country = data.get("country", "")
-        iata = data.get("iata", "")
-
-        if not isinstance(name, str):
-            name = "" if name is None else str(name)
-        if not isinstance(city, str):
-            city = "" if city is None else str(city)
-        if not isinstance(country, str):
-            country = "" if country is None else str(country)
-        if not isinstance(iata, str):
-            iata = "" if iata is None else str(iata)
-
-        airports.append(
-            {
-                "id": int(node_id),
-                "name": name,
-                "city": city,
-                "country": country,
-                "iata": iata,
-                "lat": safe_lat,
-                "lon": safe_lon,
-            }
-        )
+        for i in np.flatnonzero(mask).tolist()
+    ]
 
-    return {"airports": airports}
+    # Toàn kiểu JSON gốc -> trả ORJSONResponse trực tiếp, bỏ qua jsonable_encoder
+    return ORJSONResponse({"airports": airports})
 
 @router.post("/simulate")
 async def simulate(req: SimulateRequest):
@@ -203,14 +192,11 @@ async def simulate(req: SimulateRequest):
 @router.post("/attack/remove/node/{node_id}")
 async def remove_node(node_id: int):
     """Remove a node (airport)"""
-    print(f"API: Removing node {node_id}")
-    print(f"Current removed_nodes: {app_state.removed_nodes}")
+    logger.debug("API: Removing node %s", node_id)
     if app_state.remove_node(node_id):
-        print(f"Node {node_id} removed successfully")
-        print(f"Updated removed_nodes: {app_state.removed_nodes}")
-        print(f"Updated removed_edges: {app_state.removed_edges}")
+        logger.debug("Node %s removed (removed_nodes=%s, removed_edges=%s)", node_id, app_state.removed_nodes, app_state.removed_edges)
         return {"success": True, "node_id": node_id}
-    print(f"Failed to remove node {node_id}")
+    logger.debug("Failed to remove node %s", node_id)
     raise HTTPException(400, "Node not found or already removed")
 
 @router.post("/attack/restore/node/{node_id}")
@@ -223,11 +209,11 @@ async def restore_node(node_id: int):
 @router.post("/attack/remove/edge")
 async def remove_edge(src: int = Query(...), dst: int = Query(...)):
     """Remove an edge (route)"""
-    print(f"API: Removing edge {src} -> {dst}")
+    logger.debug("API: Removing edge %s -> %s", src, dst)
     if app_state.remove_edge(src, dst):
-        print(f"Edge {src} -> {dst} removed successfully")
+        logger.debug("Edge %s -> %s removed successfully", src, dst)
         return {"success": True, "source": src, "target": dst}
-    print(f"Failed to remove edge {src} -> {dst}")
+    logger.debug("Failed to remove edge %s -> %s", src, dst)
     raise HTTPException(400, "Edge not found or already removed")
 
 @router.post("/attack/restore/edge")
@@ -243,38 +229,40 @@ async def get_removed():
     if app_state.graph_undirected is None:
         raise HTTPException(400, "Graph not loaded")
     
-    removed_nodes_info = []
-    for node_id in app_state.removed_nodes:
-        if node_id in app_state.graph:
-            data = app_state.graph.nodes[node_id]
-            removed_nodes_info.append({
-                "id": node_id,
-                "name": data.get("name", ""),
-                "city": data.get("city", ""),
-                "country": data.get("country", ""),
-                "iata": data.get("iata", ""),
-                "type": "node"
-            })
-    
-    removed_edges_info = []
-    for (src, dst) in app_state.removed_edges:
-        if src in app_state.graph and dst in app_state.graph:
-            src_data = app_state.graph.nodes[src]
-            dst_data = app_state.graph.nodes[dst]
-            removed_edges_info.append({
-                "source": src,
-                "target": dst,
-                "source_name": src_data.get("name", ""),
-                "target_name": dst_data.get("name", ""),
-                "source_iata": src_data.get("iata", ""),
-                "target_iata": dst_data.get("iata", ""),
-                "type": "edge"
-            })
+    # Hoist the node view once; one attribute-dict lookup per node
+    nodes = app_state.graph.nodes
+    removed_nodes_info = [
+        {
+            "id": node_id,
+            "name": data.get("name", ""),
+            "city": data.get("city", ""),
+            "country": data.get("country", ""),
+            "iata": data.get("iata", ""),
+            "type": "node"
+        }
+        for node_id in app_state.removed_nodes if node_id in nodes
+        for data in (nodes[node_id],)
+    ]
+    
+    removed_edges_info = [
+        {
+            "source": src,
+            "target": dst,
+            "source_name": src_data.get("name", ""),
+            "target_name": dst_data.get("name", ""),
+            "source_iata": src_data.get("iata", ""),
+            "target_iata": dst_data.get("iata", ""),
+            "type": "edge"
+        }
+        for src, dst in app_state.removed_edges if src in nodes and dst in nodes
+        for src_data, dst_data in ((nodes[src], nodes[dst]),)
+    ]
     
-    return {
+    # Trả ORJSONResponse trực tiếp để bỏ qua jsonable_encoder
+    return ORJSONResponse({
         "nodes": removed_nodes_info,
         "edges": removed_edges_info
-    }
+    })
 
 @router.post("/attack/reset")
 async def reset_attacks():
@@ -293,45 +281,27 @@ async def graph_stats():
     return get_stats(G)
 
 @router.get("/attack/top-hubs")
+@cache(expire=CACHE_EXPIRE_SECONDS, key_builder=graph_key_builder)
 async def get_top_hubs(
     k: int = 10,
-    minLat: Optional[float] = Query(None),
-    maxLat: Optional[float] = Query(None),
-    minLon: Optional[float] = Query(None),
-    maxLon: Optional[float] = Query(None)
+    bbox: Optional[BBox] = Depends(parse_bbox),
 ):
     """Get top-k hubs by degree and betweenness (filtered by region)"""
     if app_state.graph_undirected is None:
         raise HTTPException(400, "Graph not loaded")
-    G = app_state.get_active_graph()
-    if G is None:
-        raise HTTPException(400, "Graph not loaded")
-    
     # Filter by bbox if provided
-    bbox = None
-    if any([minLat, maxLat, minLon, maxLon]):
-        bbox = {
-            "minLat": minLat,
-            "maxLat": maxLat,
-            "minLon": minLon,
-            "maxLon": maxLon
-        }
-        G = filter_graph_by_bbox(G, bbox)
+    G = _filtered_graph(app_state.graph_version, bbox)
     
-    import networkx as nx
+    # Top by degree (cached per graph_version + bbox)
+    top_degree = _cached_degree_sorted(app_state.graph_version, bbox)[:k]
     
-    # Top by degree
-    degrees = dict(G.degree())
-    top_degree = sorted(degrees.items(), key=lambda x: x[1], reverse=True)[:k]
-    
-    # Top by betweenness (approximate for large graphs) - skip if too large
+    # Top by betweenness (exact) - skip if too large
     top_betweenness = []
-    if len(G) <= 50:  # Only calculate for small graphs
+    if len(G) <= EXACT_BETWEENNESS_MAX_NODES:  # 50 nodes without graph-tool
         try:
-            betweenness = nx.betweenness_centrality(G)
-            top_betweenness = sorted(betweenness.items(), key=lambda x: x[1], reverse=True)[:k]
+            top_betweenness = _cached_betweenness(app_state.graph_version, bbox, None)[:k]
         except Exception as e:
-            print(f"Error calculating betweenness: {e}")
+            logger.warning("Error calculating betweenness: %s", e)
             top_betweenness = []
     
     hubs_degree = []
@@ -368,135 +338,93 @@ async def get_top_hubs(
     }
 
 @router.get("/defend/redundancy")
+@cache(expire=CACHE_EXPIRE_SECONDS, key_builder=graph_key_builder)
 async def get_redundancy_suggestions(
     m: int = 10,
     max_distance_km: float = 3000,
-    minLat: Optional[float] = Query(None),
-    maxLat: Optional[float] = Query(None),
-    minLon: Optional[float] = Query(None),
-    maxLon: Optional[float] = Query(None)
+    bbox: Optional[BBox] = Depends(parse_bbox),
 ):
     """Get redundancy suggestions (filtered by region)"""
     if app_state.graph_undirected is None:
         raise HTTPException(400, "Graph not loaded")
-    G = app_state.get_active_graph()
-    if G is None:
-        raise HTTPException(400, "Graph not loaded")
-    
     # Filter by bbox if provided
-    bbox = None
-    if any([minLat, maxLat, minLon, maxLon]):
-        bbox = {
-            "minLat": minLat,
-            "maxLat": maxLat,
-            "minLon": minLon,
-            "maxLon": maxLon
-        }
-        G = filter_graph_by_bbox(G, bbox)
+    G = _filtered_graph(app_state.graph_version, bbox)
     
     suggestions = suggest_redundancy(G, m=m, max_distance_km=max_distance_km)
     return {"suggestions": suggestions}
 
+# Known region bboxes (minLat, maxLat, minLon, maxLon) -> region key of the pre-computed results
+_REGION_BY_BBOX = {
+    (-10, 30, 90, 150): "southeast-asia",
+    (-10, 55, 60, 150): "asia",
+    (35, 72, -15, 40): "europe",
+    (15, 72, -170, -50): "north-america",
+}
+
 @router.get("/attack/impact")
+@cache(expire=CACHE_EXPIRE_SECONDS, key_builder=graph_key_builder)
 async def get_attack_impact(
     region: Optional[str] = Query(None),
     k: int = 10,
-    minLat: Optional[float] = Query(None),
-    maxLat: Optional[float] = Query(None),
-    minLon: Optional[float] = Query(None),
-    maxLon: Optional[float] = Query(None)
+    bbox: Optional[BBox] = Depends(parse_bbox),
 ):
     """Get pre-computed attack impact or compute on-the-fly"""
-    import json
-    import os
-    
-    # Try to load pre-computed results first
-    import pathlib
-    precomputed_file = pathlib.Path(__file__).parent.parent / "precomputed_attacks.json"
-    
-    # Determine region key from bbox or region parameter
-    region_key = region
-    if not region_key:
-        # Map bbox to region
-        if any([minLat, maxLat, minLon, maxLon]):
-            # Try to match bbox to known regions
-            bbox = {"minLat": minLat, "maxLat": maxLat, "minLon": minLon, "maxLon": maxLon}
-            if (bbox.get("minLat") == -10 and bbox.get("maxLat") == 30 and 
-                bbox.get("minLon") == 90 and bbox.get("maxLon") == 150):
-                region_key = "southeast-asia"
-            elif (bbox.get("minLat") == -10 and bbox.get("maxLat") == 55 and
-                  bbox.get("minLon") == 60 and bbox.get("maxLon") == 150):
-                region_key = "asia"
-            elif (bbox.get("minLat") == 35 and bbox.get("maxLat") == 72 and
-                  bbox.get("minLon") == -15 and bbox.get("maxLon") == 40):
-                region_key = "europe"
-            elif (bbox.get("minLat") == 15 and bbox.get("maxLat") == 72 and
-                  bbox.get("minLon") == -170 and bbox.get("maxLon") == -50):
-                region_key = "north-america"
-    
-    # Try to load pre-computed data
-    if region_key and precomputed_file.exists():
-        try:
-            with open(precomputed_file, 'r', encoding='utf-8') as f:
-                precomputed = json.load(f)
-                if region_key in precomputed:
-                    print(f"Using pre-computed data for {region_key}")
-                    return precomputed[region_key]
-        except Exception as e:
-            print(f"Error loading pre-computed data: {e}")
+    # Determine region key from region parameter, else from an exact bbox match
+    region_key = region or _REGION_BY_BBOX.get(bbox)
+    
+    # Pre-computed data (parsed once at startup)
+    if region_key and region_key in app_state.precomputed:
+        logger.debug("Using pre-computed data for %s", region_key)
+        return app_state.precomputed[region_key]
     
     # Compute on-the-fly - Optimized for Southeast Asia
     if app_state.graph_undirected is None:
         raise HTTPException(400, "Graph not loaded")
-    G = app_state.get_active_graph()
-    if G is None:
-        raise HTTPException(400, "Graph not loaded")
-    
     # Filter by bbox (default to Southeast Asia)
-    bbox = None
-    if any([minLat, maxLat, minLon, maxLon]):
-        bbox = {
-            "minLat": minLat,
-            "maxLat": maxLat,
-            "minLon": minLon,
-            "maxLon": maxLon
-        }
-        G = filter_graph_by_bbox(G, bbox)
-    else:
-        # Default to Southeast Asia
-        bbox = {"minLat": -10, "maxLat": 30, "minLon": 90, "maxLon": 150}
-        G = filter_graph_by_bbox(G, bbox)
+    if bbox is None:
+        bbox = SEA_BBOX
+    G = _filtered_graph(app_state.graph_version, bbox)
     
     if len(G) == 0:
         raise HTTPException(400, "No nodes in region")
     
-    print(f"Computing attack impact for {len(G)} nodes, {G.number_of_edges()} edges")
+    logger.debug("Computing attack impact for %d nodes, %d edges", len(G), G.number_of_edges())
     
     baseline = get_stats(G)
     
     # Define fractions: 0 to 0.5 in steps of 0.05 (11 points)
     fractions = [round(i * 0.05, 2) for i in range(11)]
     
-    # Run main attack strategies
-    print("Running random_attack...")
-    random_result = simulate_attack(G, "random_attack", fractions=fractions, n_runs=5, seed=42)
-    
-    print("Running degree_targeted_attack...")
-    degree_result = simulate_attack(G, "degree_targeted_attack", fractions=fractions, n_runs=1)
-
-    print("Running pagerank_targeted_attack...")
-    pagerank_result = simulate_attack(G, "pagerank_targeted_attack", fractions=fractions, n_runs=1)
-    
-    print("Running betweenness_targeted_attack...")
+    # Run main attack strategies concurrently on the simulation pool
+    graph_version = app_state.graph_version
+    fractions_key = tuple(fractions)
+    logger.debug("Running random/degree/pagerank attacks...")
+    random_job = _in_pool(_cached_sim, graph_version, bbox, "random_attack", fractions_key, n_runs=5, seed=42)
+    degree_job = _in_pool(_cached_sim, graph_version, bbox, "degree_targeted_attack", fractions_key)
+    pagerank_job = _in_pool(_cached_sim, graph_version, bbox, "pagerank_targeted_attack", fractions_key)
+    betweenness_job = None
+    if len(G) <= BETWEENNESS_ATTACK_MAX_NODES:  # Only for smaller graphs
+        logger.debug("Running betweenness_targeted_attack...")
+        betweenness_job = _in_pool(_cached_sim, graph_version, bbox, "betweenness_targeted_attack", fractions_key)
+    else:
+        logger.debug("Skipping betweenness attack (graph too large: %d nodes)", len(G))
+    
+    # One gather for every job, so none is left running unawaited if another fails
+    # (pool threads can't be cancelled once started). Betweenness is optional; the others re-raise.
+    jobs = [random_job, degree_job, pagerank_job]
+    if betweenness_job is not None:
+        jobs.append(betweenness_job)
+    results = await asyncio.gather(*jobs, return_exceptions=True)
+    for result in results[:3]:
+        if isinstance(result, BaseException):
+            raise result
+    random_result, degree_result, pagerank_result = results[:3]
     betweenness_result = None
-    if len(G) <= 200:  # Only for smaller graphs
-        try:
-            betweenness_result = simulate_attack(G, "betweenness_targeted_attack", fractions=fractions, n_runs=1)
-        except Exception as e:
-            print(f"Betweenness attack failed: {e}")
+    if betweenness_job is not None:
+        betweenness_result = results[3]
+        if isinstance(betweenness_result, BaseException):
+            logger.warning("Betweenness attack failed: %s", betweenness_result)
             betweenness_result = None
-    else:
-        print(f"Skipping betweenness attack (graph too large: {len(G)} nodes)")
     
     return {
         "baseline": baseline,
@@ -507,34 +435,19 @@ async def get_attack_impact(
     }
 
 @router.get("/defense/impact")
+@cache(expire=CACHE_EXPIRE_SECONDS, key_builder=graph_key_builder)
 async def get_defense_impact(
-    minLat: Optional[float] = Query(None),
-    maxLat: Optional[float] = Query(None),
-    minLon: Optional[float] = Query(None),
-    maxLon: Optional[float] = Query(None),
+    bbox: Optional[BBox] = Depends(parse_bbox),
     k_hubs: int = Query(10, description="Number of top hubs to reinforce"),
     n_runs: int = Query(5, description="Number of runs for random attack averaging")
 ):
     """Get defense impact: compare attacks on original vs reinforced graph"""
     if app_state.graph_undirected is None:
         raise HTTPException(400, "Graph not loaded")
-    G = app_state.get_active_graph()
-    if G is None:
-        raise HTTPException(400, "Graph not loaded")
-    
     # Filter by bbox (default to Southeast Asia)
-    bbox = None
-    if any([minLat, maxLat, minLon, maxLon]):
-        bbox = {
-            "minLat": minLat,
-            "maxLat": maxLat,
-            "minLon": minLon,
-            "maxLon": maxLon
-        }
-        G = filter_graph_by_bbox(G, bbox)
-    else:
-        bbox = {"minLat": -10, "maxLat": 30, "minLon": 90, "maxLon": 150}
-        G = filter_graph_by_bbox(G, bbox)
+    if bbox is None:
+        bbox = SEA_BBOX
+    G = _filtered_graph(app_state.graph_version, bbox)
     
     if len(G) == 0:
         raise HTTPException(400, "No nodes in region")
@@ -545,7 +458,7 @@ async def get_defense_impact(
     G_lcc = G.subgraph(lcc_nodes).copy()
     N0_original = len(G_lcc)
     
-    print(f"Computing defense impact for LCC: {N0_original} nodes (original graph had {len(G)} nodes)")
+    logger.debug("Computing defense impact for LCC: %d nodes (original graph had %d nodes)", N0_original, len(G))
     
     # Reinforce graph (TER method works on LCC and returns LCC)
     G_reinforced, added_edges_list = add_edges_by_effective_resistance(
@@ -556,7 +469,7 @@ async def get_defense_impact(
         seed=123
     )
     added_edges_count = len(added_edges_list)
-    print(f"Reinforced graph: {G_reinforced.number_of_edges()} edges (original LCC: {G_lcc.number_of_edges()}, added: {added_edges_count})")
+    logger.debug("Reinforced graph: %d edges (original LCC: %d, added: %d)", G_reinforced.number_of_edges(), G_lcc.number_of_edges(), added_edges_count)
     
     baseline_original = get_stats(G_lcc)
     baseline_reinforced = get_stats(G_reinforced)
@@ -564,11 +477,11 @@ async def get_defense_impact(
     fractions = [round(i * 0.05, 2) for i in range(11)]
     
     # Test degree attack on both (both are LCC with same nodes)
-    print(f"Testing degree attack on original LCC (N0={N0_original})...")
-    degree_original = simulate_attack(G_lcc, "degree_targeted_attack", fractions=fractions, n_runs=1)
-    
-    print(f"Testing degree attack on reinforced LCC (N0={len(G_reinforced)})...")
-    degree_reinforced = simulate_attack(G_reinforced, "degree_targeted_attack", fractions=fractions, n_runs=1)
+    logger.debug("Testing degree attack on original LCC (N0=%d) and reinforced LCC (N0=%d)...", N0_original, len(G_reinforced))
+    degree_original, degree_reinforced = await asyncio.gather(
+        _in_pool(_cached_sim, app_state.graph_version, bbox, "degree_targeted_attack", tuple(fractions), lcc_only=True),
+        _in_pool(simulate_attack, G_reinforced, "degree_targeted_attack", fractions=fractions, n_runs=1),
+    )
     
     return {
         "baseline_original": baseline_original,
@@ -578,12 +491,10 @@ async def get_defense_impact(
     }
 
 @router.get("/attack/top-k-impact")
+@cache(expire=CACHE_EXPIRE_SECONDS, key_builder=graph_key_builder)
 async def get_top_k_impact(
     k: int = Query(10, description="Number of top hubs to remove"),
-    minLat: Optional[float] = Query(None),
-    maxLat: Optional[float] = Query(None),
-    minLon: Optional[float] = Query(None),
-    maxLon: Optional[float] = Query(None),
+    bbox: Optional[BBox] = Depends(parse_bbox),
     strategy: str = Query("degree", description="Strategy: 'degree' or 'betweenness'")
 ):
     """Analyze impact of removing top-k hubs
@@ -595,52 +506,34 @@ async def get_top_k_impact(
     """
     if app_state.graph_undirected is None:
         raise HTTPException(400, "Graph not loaded")
-    G = app_state.get_active_graph()
-    if G is None:
-        raise HTTPException(400, "Graph not loaded")
-    
     # Filter by bbox (default to Southeast Asia)
-    bbox = None
-    if any([minLat, maxLat, minLon, maxLon]):
-        bbox = {
-            "minLat": minLat,
-            "maxLat": maxLat,
-            "minLon": minLon,
-            "maxLon": maxLon
-        }
-        G = filter_graph_by_bbox(G, bbox)
-    else:
-        bbox = {"minLat": -10, "maxLat": 30, "minLon": 90, "maxLon": 150}
-        G = filter_graph_by_bbox(G, bbox)
+    if bbox is None:
+        bbox = SEA_BBOX
+    G = _filtered_graph(app_state.graph_version, bbox)
     
     if len(G) == 0:
         raise HTTPException(400, "No nodes in region")
     
-    import networkx as nx
-    from app.metrics import get_stats
-    
     baseline = get_stats(G)
     
     # Get top-k hubs
     if strategy == "degree":
-        degrees = dict(G.degree())
-        top_hubs = sorted(degrees.items(), key=lambda x: x[1], reverse=True)[:k]
+        top_hubs = _cached_degree_sorted(app_state.graph_version, bbox)[:k]
         hub_list = [node_id for node_id, _ in top_hubs]
     elif strategy == "betweenness":
         # Use approximation for large graphs to speed up
         try:
-            if len(G) > 50:
+            if len(G) > EXACT_BETWEENNESS_MAX_NODES:
                 # Use sampling for large graphs (approximate betweenness)
                 sample_size = min(50, len(G))
-                print(f"Using approximate betweenness centrality (sample_size={sample_size}) for graph with {len(G)} nodes")
-                betweenness = nx.betweenness_centrality(G, k=sample_size)
+                logger.debug("Using approximate betweenness centrality (sample_size=%d) for graph with %d nodes", sample_size, len(G))
             else:
                 # Exact calculation for small graphs
-                betweenness = nx.betweenness_centrality(G)
-            top_hubs = sorted(betweenness.items(), key=lambda x: x[1], reverse=True)[:k]
+                sample_size = None
+            top_hubs = _cached_betweenness(app_state.graph_version, bbox, sample_size)[:k]
             hub_list = [node_id for node_id, _ in top_hubs]
         except Exception as e:
-            print(f"Error calculating betweenness: {e}")
+            logger.warning("Error calculating betweenness: %s", e)
             raise HTTPException(400, f"Error calculating betweenness centrality: {str(e)}")
     else:
         raise HTTPException(400, "Invalid strategy. Use 'degree' or 'betweenness'")
@@ -660,8 +553,7 @@ async def get_top_k_impact(
                 "lon": data.get("lon")
             })
     
-    # Simulate sequential removal
-    G_copy = G.copy()
+    # Simulate sequential removal (incremental: reverse add-back with a DSU)
     impact_curve = []
     impact_curve.append({
         "step": 0,
@@ -670,16 +562,14 @@ async def get_top_k_impact(
         **baseline
     })
     
-    for step, node_id in enumerate(hub_list[:k], 1):
-        if node_id in G_copy:
-            G_copy.remove_node(node_id)
-            stats = get_stats(G_copy)
-            impact_curve.append({
-                "step": step,
-                "removed": step,
-                "fraction_removed": step / len(G) if len(G) > 0 else 0,
-                **stats
-            })
+    removal_order = [node_id for node_id in hub_list[:k] if node_id in G]
+    for step, stats in enumerate(sequential_removal_stats(G, removal_order), 1):
+        impact_curve.append({
+            "step": step,
+            "removed": step,
+            "fraction_removed": step / len(G) if len(G) > 0 else 0,
+            **stats
+        })
     
     return {
         "baseline": baseline,
@@ -690,6 +580,7 @@ async def get_top_k_impact(
     }
 
 @router.get("/attack/impact-custom")
+@cache(expire=CACHE_EXPIRE_SECONDS, key_builder=graph_key_builder)
 async def get_attack_impact_custom(
     strategy: str = Query(
         ...,
@@ -700,17 +591,11 @@ async def get_attack_impact_custom(
     ),
     max_fraction: float = Query(0.5, description="Maximum fraction to remove (0.0 to 1.0)"),
     n_runs: int = Query(5, description="Number of runs for averaging (only for random_attack)"),
-    minLat: Optional[float] = Query(None),
-    maxLat: Optional[float] = Query(None),
-    minLon: Optional[float] = Query(None),
-    maxLon: Optional[float] = Query(None)
+    bbox: Optional[BBox] = Depends(parse_bbox),
 ):
     """Get attack impact with custom parameters"""
     if app_state.graph_undirected is None:
         raise HTTPException(400, "Graph not loaded")
-    G = app_state.get_active_graph()
-    if G is None:
-        raise HTTPException(400, "Graph not loaded")
     
     if strategy not in [
         "random_attack",
@@ -721,18 +606,9 @@ async def get_attack_impact_custom(
         raise HTTPException(400, "Invalid strategy")
     
     # Filter by bbox (default to Southeast Asia)
-    bbox = None
-    if any([minLat, maxLat, minLon, maxLon]):
-        bbox = {
-            "minLat": minLat,
-            "maxLat": maxLat,
-            "minLon": minLon,
-            "maxLon": maxLon
-        }
-        G = filter_graph_by_bbox(G, bbox)
-    else:
-        bbox = {"minLat": -10, "maxLat": 30, "minLon": 90, "maxLon": 150}
-        G = filter_graph_by_bbox(G, bbox)
+    if bbox is None:
+        bbox = SEA_BBOX
+    G = _filtered_graph(app_state.graph_version, bbox)
     
     if len(G) == 0:
         raise HTTPException(400, "No nodes in region")
@@ -744,10 +620,11 @@ async def get_attack_impact_custom(
     fractions = [round(i * max_fraction / (num_points - 1), 3) for i in range(num_points)]
     
     # Run attack (betweenness is already approximated inside simulate_attack for large graphs)
-    result = simulate_attack(
-        G,
+    result = _cached_sim(
+        app_state.graph_version,
+        bbox,
         strategy,
-        fractions=fractions,
+        tuple(fractions),
         n_runs=n_runs if strategy == "random_attack" else 1,
         seed=42,
     )
@@ -760,40 +637,25 @@ async def get_attack_impact_custom(
     }
 
 @router.get("/defense/impact-custom")
+@cache(expire=CACHE_EXPIRE_SECONDS, key_builder=graph_key_builder)
 async def get_defense_impact_custom(
     k_hubs: int = Query(10, description="Number of top hubs to reinforce"),
     max_distance_km: float = Query(2000, description="Maximum distance for backup edges"),
     attack_strategy: str = Query("degree_targeted_attack", description="Attack strategy to test"),
-    minLat: Optional[float] = Query(None),
-    maxLat: Optional[float] = Query(None),
-    minLon: Optional[float] = Query(None),
-    maxLon: Optional[float] = Query(None)
+    bbox: Optional[BBox] = Depends(parse_bbox),
 ):
     """Get defense impact with custom parameters"""
     if app_state.graph_undirected is None:
         raise HTTPException(400, "Graph not loaded")
-    G = app_state.get_active_graph()
-    if G is None:
-        raise HTTPException(400, "Graph not loaded")
-    
     # Filter by bbox (default to Southeast Asia)
-    bbox = None
-    if any([minLat, maxLat, minLon, maxLon]):
-        bbox = {
-            "minLat": minLat,
-            "maxLat": maxLat,
-            "minLon": minLon,
-            "maxLon": maxLon
-        }
-        G = filter_graph_by_bbox(G, bbox)
-    else:
-        bbox = {"minLat": -10, "maxLat": 30, "minLon": 90, "maxLon": 150}
-        G = filter_graph_by_bbox(G, bbox)
+    if bbox is None:
+        bbox = SEA_BBOX
+    G = _filtered_graph(app_state.graph_version, bbox)
     
     if len(G) == 0:
         raise HTTPException(400, "No nodes in region")
     
-    print(f"Computing defense impact: k_hubs={k_hubs}, max_distance={max_distance_km}km")
+    logger.debug("Computing defense impact: k_hubs=%s, max_distance=%skm", k_hubs, max_distance_km)
     
     # IMPORTANT: Filter to LCC only (matching notebook implementation)
     # This ensures both Original and Reinforced work on the same set of nodes
@@ -802,7 +664,7 @@ async def get_defense_impact_custom(
     G_lcc = G.subgraph(lcc_nodes).copy()
     N0_original = len(G_lcc)
     
-    print(f"Working on LCC: {N0_original} nodes (original graph had {len(G)} nodes)")
+    logger.debug("Working on LCC: %d nodes (original graph had %d nodes)", N0_original, len(G))
     
     # Reinforce graph (TER method works on LCC and returns LCC)
     G_reinforced, added_edges_list = add_edges_by_effective_resistance(
@@ -816,9 +678,9 @@ async def get_defense_impact_custom(
     
     # Verify both graphs have the same number of nodes (both should be LCC)
     if len(G_reinforced) != N0_original:
-        print(f"Warning: Reinforced graph has {len(G_reinforced)} nodes, LCC has {N0_original} nodes")
+        logger.warning("Reinforced graph has %d nodes, LCC has %d nodes", len(G_reinforced), N0_original)
     else:
-        print(f"Verified: Both graphs have {N0_original} nodes")
+        logger.debug("Verified: Both graphs have %d nodes", N0_original)
     
     # Use LCC for both original and reinforced (both have same nodes)
     baseline_original = get_stats(G_lcc)
@@ -827,11 +689,11 @@ async def get_defense_impact_custom(
     fractions = [round(i * 0.05, 2) for i in range(11)]
     
     # Test attack on both (both will normalize by N0_original, which is the same)
-    print(f"Testing {attack_strategy} on original LCC (N0={N0_original})...")
-    attack_original = simulate_attack(G_lcc, attack_strategy, fractions=fractions, n_runs=1)
-    
-    print(f"Testing {attack_strategy} on reinforced LCC (N0={len(G_reinforced)})...")
-    attack_reinforced = simulate_attack(G_reinforced, attack_strategy, fractions=fractions, n_runs=1)
+    logger.debug("Testing %s on original LCC (N0=%d) and reinforced LCC (N0=%d)...", attack_strategy, N0_original, len(G_reinforced))
+    attack_original, attack_reinforced = await asyncio.gather(
+        _in_pool(_cached_sim, app_state.graph_version, bbox, attack_strategy, tuple(fractions), lcc_only=True),
+        _in_pool(simulate_attack, G_reinforced, attack_strategy, fractions=fractions, n_runs=1),
+    )
     
     return {
         "baseline_original": baseline_original,
@@ -850,10 +712,7 @@ async def get_defense_impact_schneider(
     max_trials: int = Query(20000, description="Maximum number of swap trials"),
     patience: int = Query(5000, description="Stop if no improvement after N trials"),
     attack_strategy: str = Query("degree_targeted_attack", description="Attack strategy to test"),
-    minLat: Optional[float] = Query(None),
-    maxLat: Optional[float] = Query(None),
-    minLon: Optional[float] = Query(None),
-    maxLon: Optional[float] = Query(None)
+    bbox: Optional[BBox] = Depends(parse_bbox),
 ):
     """
     Get Schneider defense impact (edge swapping method).
@@ -865,28 +724,15 @@ async def get_defense_impact_schneider(
     """
     if app_state.graph_undirected is None:
         raise HTTPException(400, "Graph not loaded")
-    G = app_state.get_active_graph()
-    if G is None:
-        raise HTTPException(400, "Graph not loaded")
-    
     # Filter by bbox (default to Southeast Asia)
-    bbox = None
-    if any([minLat, maxLat, minLon, maxLon]):
-        bbox = {
-            "minLat": minLat,
-            "maxLat": maxLat,
-            "minLon": minLon,
-            "maxLon": maxLon
-        }
-        G = filter_graph_by_bbox(G, bbox)
-    else:
-        bbox = {"minLat": -10, "maxLat": 30, "minLon": 90, "maxLon": 150}
-        G = filter_graph_by_bbox(G, bbox)
+    if bbox is None:
+        bbox = SEA_BBOX
+    G = _filtered_graph(app_state.graph_version, bbox)
     
     if len(G) == 0:
         raise HTTPException(400, "No nodes in region")
     
-    print(f"Computing Schneider defense impact: max_trials={max_trials}, patience={patience}")
+    logger.debug("Computing Schneider defense impact: max_trials=%s, patience=%s", max_trials, patience)
     
     # IMPORTANT: Filter to LCC only (matching notebook implementation)
     from app.metrics import get_lcc
@@ -894,7 +740,7 @@ async def get_defense_impact_schneider(
     G_lcc = G.subgraph(lcc_nodes).copy()
     N0_original = len(G_lcc)
     
-    print(f"Working on LCC: {N0_original} nodes (original graph had {len(G)} nodes)")
+    logger.debug("Working on LCC: %d nodes (original graph had %d nodes)", N0_original, len(G))
     
     # Apply Schneider defense (works on LCC and returns LCC)
     G_optimized, schneider_info = reinforce_graph_schneider(
@@ -906,9 +752,9 @@ async def get_defense_impact_schneider(
     
     # Verify both graphs have the same number of nodes (both should be LCC)
     if len(G_optimized) != N0_original:
-        print(f"Warning: Optimized graph has {len(G_optimized)} nodes, LCC has {N0_original} nodes")
+        logger.warning("Optimized graph has %d nodes, LCC has %d nodes", len(G_optimized), N0_original)
     else:
-        print(f"Verified: Both graphs have {N0_original} nodes")
+        logger.debug("Verified: Both graphs have %d nodes", N0_original)
     
     # Note: Schneider swaps edges, so edge count may change slightly
     swapped_edges_info = {
@@ -925,11 +771,11 @@ async def get_defense_impact_schneider(
     fractions = [round(i * 0.05, 2) for i in range(11)]
     
     # Test attack on both (both will normalize by N0_original, which is the same)
-    print(f"Testing {attack_strategy} on original LCC (N0={N0_original})...")
-    attack_original = simulate_attack(G_lcc, attack_strategy, fractions=fractions, n_runs=1)
-    
-    print(f"Testing {attack_strategy} on Schneider-optimized LCC (N0={len(G_optimized)})...")
-    attack_optimized = simulate_attack(G_optimized, attack_strategy, fractions=fractions, n_runs=1)
+    logger.debug("Testing %s on original LCC (N0=%d) and Schneider-optimized LCC (N0=%d)...", attack_strategy, N0_original, len(G_optimized))
+    attack_original, attack_optimized = await asyncio.gather(
+        _in_pool(_cached_sim, app_state.graph_version, bbox, attack_strategy, tuple(fractions), lcc_only=True),
+        _in_pool(simulate_attack, G_optimized, attack_strategy, fractions=fractions, n_runs=1),
+    )
     
     return {
         "baseline_original": baseline_original,
@@ -954,24 +800,15 @@ async def route_metrics(
     - Đo số bước (hops) và số đường đi ngắn nhất giữa 2 sân bay.
     - Tuỳ chọn: so sánh trước/sau khi thêm defense (reinforce_graph).
     """
-    import networkx as nx
-
     if app_state.graph_undirected is None:
         raise HTTPException(400, "Graph not loaded")
     G_full = app_state.get_active_graph()
     if G_full is None:
         raise HTTPException(400, "Graph not loaded")
 
-    # Ensure edge weights for weighted routing
-    G_full = _ensure_edge_weights(G_full.copy())
-
-    # Tìm node id theo IATA
+    # Tìm node id theo IATA (tra chỉ mục dựng sẵn lúc load)
     def find_airport_id(iata: str) -> int:
-        iata_up = iata.strip().upper()
-        for node_id, data in G_full.nodes(data=True):
-            if str(data.get("iata", "")).upper() == iata_up:
-                return int(node_id)
-        raise HTTPException(404, f"Airport with IATA '{iata}' not found")
+        return _lookup_iata(iata, G_full)
 
     try:
         src_id = find_airport_id(src_iata)
@@ -982,27 +819,20 @@ async def route_metrics(
         raise HTTPException(400, f"Error looking up airports: {e}")
 
     def compute_metrics(G):
-        try:
-            path = nx.shortest_path(G, source=src_id, target=dst_id)
-            hops = len(path) - 1
-            # Đếm số đường đi ngắn nhất (độ dài = hops)
-            num_shortest = 0
-            for _p in nx.all_shortest_paths(G, source=src_id, target=dst_id):
-                num_shortest += 1
-            path_iata = [G.nodes[n].get("iata", str(n)) for n in path]
-            return {
-                "connected": True,
-                "hops": hops,
-                "num_shortest_paths": num_shortest,
-                "path_iata": path_iata,
-            }
-        except nx.NetworkXNoPath:
+        hops, num_shortest, path = _count_shortest_paths(G, src_id, dst_id)
+        if hops is None:
             return {
                 "connected": False,
                 "hops": None,
                 "num_shortest_paths": 0,
                 "path_iata": [],
             }
+        return {
+            "connected": True,
+            "hops": hops,
+            "num_shortest_paths": num_shortest,
+            "path_iata": _path_to_iata(path),
+        }
 
     baseline = compute_metrics(G_full)
 
@@ -1011,9 +841,13 @@ async def route_metrics(
     if with_defense:
         # Work on the connected component that actually contains src and dst.
         # If no path exists between src and dst, do NOT raise; just skip defense metrics.
-        import networkx as nx
-        if nx.has_path(G_full, src_id, dst_id):
-            comp_nodes = nx.node_connected_component(G_full, src_id)
+        # A single connected-components pass over the active CSR answers both
+        # questions (reachability and membership of src's component).
+        node_pos = app_state.node_id_to_idx
+        _, labels = connected_components(app_state.get_active_csr(), directed=False, return_labels=True)
+        src_label = labels[node_pos[src_id]]
+        if labels[node_pos[dst_id]] == src_label:
+            comp_nodes = app_state.node_ids[labels == src_label].tolist()
             G_comp = G_full.subgraph(comp_nodes).copy()
 
             # Reinforce the connected component (TER method expects a connected graph)
@@ -1040,34 +874,131 @@ async def route_metrics(
     }
 
 
-def _ensure_edge_weights(G: nx.Graph) -> nx.Graph:
+@lru_cache(maxsize=16)
+def _filtered_graph(graph_version: int, bbox_key: Optional[BBox]) -> nx.Graph:
     """
-    Đảm bảo tất cả edges có trọng số 'weight' (khoảng cách km).
-    Nếu chưa có, tính từ distance_km hoặc từ tọa độ.
+    Active (undirected) graph restricted to bbox_key, built once per (graph_version, bbox)
+    from the node masks in app_state and shared read-only (frozen) across requests.
     """
-    from geopy.distance import great_circle
-    
-    for u, v, data in G.edges(data=True):
-        if "weight" not in data:
-            # Thử dùng distance_km nếu có
-            if "distance_km" in data and data["distance_km"] is not None:
-                data["weight"] = float(data["distance_km"])
-            else:
-                # Tính từ tọa độ
-                u_data = G.nodes[u]
-                v_data = G.nodes[v]
-                if "lat" in u_data and "lon" in u_data and "lat" in v_data and "lon" in v_data:
-                    try:
-                        dist = great_circle(
-                            (u_data["lat"], u_data["lon"]),
-                            (v_data["lat"], v_data["lon"])
-                        ).kilometers
-                        data["weight"] = dist
-                    except:
-                        data["weight"] = 99999.0
-                else:
-                    data["weight"] = 99999.0
-    return G
+    mask = app_state.active_node_mask()
+    if bbox_key is not None:
+        mask &= bbox_mask(app_state.node_lat_exact, app_state.node_lon_exact, _bbox_dict(bbox_key))
+    # Pass a set, as filter_graph_by_bbox does: subgraph node order follows set iteration
+    G = app_state.materialize_active_graph(set(app_state.node_ids[mask].tolist()))
+    return nx.freeze(G)
+
+
+@lru_cache(maxsize=256)
+def _cached_degree_sorted(graph_version: int, bbox_key: Optional[BBox]) -> Tuple[Tuple[int, int], ...]:
+    """
+    (node, degree) of the bbox-filtered active graph, highest degree first.
+    graph_version is only part of the cache key: mutations bump it, so stale entries are never hit.
+    """
+    G = _filtered_graph(graph_version, bbox_key)
+    return tuple(sorted(G.degree(), key=lambda x: x[1], reverse=True))
+
+
+@lru_cache(maxsize=256)
+def _cached_betweenness(
+    graph_version: int,
+    bbox_key: Optional[BBox],
+    sample_size: Optional[int],
+) -> Tuple[Tuple[int, float], ...]:
+    """
+    (node, betweenness) of the bbox-filtered active graph, highest first.
+    sample_size=None computes exact betweenness, otherwise the k-sample approximation.
+    """
+    G = _filtered_graph(graph_version, bbox_key)
+    node_betweenness = betweenness(G, k=sample_size)
+    return tuple(sorted(node_betweenness.items(), key=lambda x: x[1], reverse=True))
+
+
+@lru_cache(maxsize=128)
+def _cached_sim(
+    graph_version: int,
+    bbox_key: Optional[BBox],
+    strategy: str,
+    fractions: Tuple[float, ...],
+    n_runs: int = 1,
+    seed: Optional[int] = None,
+    lcc_only: bool = False,
+) -> dict:
+    """
+    simulate_attack on the bbox-filtered active graph (or its LCC when lcc_only), memoised:
+    the curve is recomputed only when graph_version changes. The returned dict is shared
+    between hits, so callers must not mutate it.
+    """
+    G = _filtered_graph(graph_version, bbox_key)
+    if lcc_only:
+        from app.metrics import get_lcc
+        G = G.subgraph(get_lcc(G)).copy()
+    return simulate_attack(G, strategy, fractions=list(fractions), n_runs=n_runs, seed=seed)
+
+
+def _count_shortest_paths(G: nx.Graph, src: int, dst: int) -> Tuple[Optional[int], int, List[int]]:
+    """
+    BFS theo lớp từ src: số hop ngắn nhất tới dst, số đường đi ngắn nhất (DP count[v] += count[u]
+    trên các cạnh giữa hai lớp liền kề) và một đường đi ngắn nhất dựng lại từ parent.
+    Trả về (None, 0, []) nếu không có đường đi.
+    """
+    dist = {src: 0}
+    count = {src: 1}
+    parent = {src: None}
+    queue = deque([src])
+    while queue:
+        u = queue.popleft()
+        if u == dst:
+            # Mọi đỉnh lớp trước đã được duyệt nên count[dst] đã đủ
+            path = [dst]
+            while parent[path[-1]] is not None:
+                path.append(parent[path[-1]])
+            path.reverse()
+            return dist[dst], count[dst], path
+        du = dist[u] + 1
+        for v in G[u]:
+            dv = dist.get(v)
+            if dv is None:
+                dist[v] = du
+                count[v] = count[u]
+                parent[v] = u
+                queue.append(v)
+            elif dv == du:
+                count[v] += count[u]
+    return None, 0, []
+
+
+def _lookup_iata(iata: str, G: nx.Graph) -> int:
+    """Node id của sân bay theo mã IATA (O(1) qua app_state.iata_index); 404 nếu không có trong G."""
+    node_id = app_state.iata_index.get(iata.strip().upper())
+    if node_id is None or node_id not in G:
+        raise HTTPException(404, f"Airport with IATA '{iata}' not found")
+    return node_id
+
+
+def _path_to_iata(path: List[int]) -> list:
+    """Đổi danh sách node id trên đường đi sang mã IATA (tra bảng node_iata đã cache)."""
+    idx = app_state.node_id_to_idx
+    return app_state.node_iata[[idx[n] for n in path]].tolist()
+
+
+def _route_result(dist: Optional[float], path: List[int]) -> dict:
+    """Kết quả một tuyến còn đường đi (path là danh sách node id)."""
+    return {
+        "connected": True,
+        "distance_km": float(dist) if dist is not None else None,
+        "path_iata": _path_to_iata(path),
+        "hops": len(path) - 1,
+    }
+
+
+def _disconnected_result() -> dict:
+    """Kết quả khi src và dst không còn đường đi."""
+    return {
+        "connected": False,
+        "distance_km": None,
+        "path_iata": [],
+        "hops": None,
+    }
 
 
 @router.get("/case/route-attack-simulation")
@@ -1089,24 +1020,15 @@ async def route_attack_simulation(
     - Kết quả khi tấn công combo nodes
     - Bar chart data để vẽ biểu đồ so sánh
     """
-    import networkx as nx
-    
     if app_state.graph_undirected is None:
         raise HTTPException(400, "Graph not loaded")
     G_full = app_state.get_active_graph()
     if G_full is None:
         raise HTTPException(400, "Graph not loaded")
     
-    # Đảm bảo edges có weight
-    G_full = _ensure_edge_weights(G_full.copy())
-    
-    # Tìm node id theo IATA
+    # Tìm node id theo IATA (tra chỉ mục dựng sẵn lúc load)
     def find_airport_id(iata: str) -> int:
-        iata_up = iata.strip().upper()
-        for node_id, data in G_full.nodes(data=True):
-            if str(data.get("iata", "")).upper() == iata_up:
-                return int(node_id)
-        raise HTTPException(404, f"Airport with IATA '{iata}' not found")
+        return _lookup_iata(iata, G_full)
     
     try:
         src_id = find_airport_id(src_iata)
@@ -1116,17 +1038,21 @@ async def route_attack_simulation(
     except Exception as e:
         raise HTTPException(400, f"Error looking up airports: {e}")
     
+    # Các kịch bản trên graph gốc chạy trên CSR (mảng) thay vì dict của NetworkX
+    node_pos = app_state.node_id_to_idx
+    node_ids = app_state.node_ids
+    src_pos, dst_pos = node_pos[src_id], node_pos[dst_id]
+    A_full = app_state.get_active_csr()
+
     # Tìm đường đi ban đầu
-    try:
-        path = nx.shortest_path(G_full, source=src_id, target=dst_id, weight="weight")
-        baseline_distance = nx.shortest_path_length(G_full, source=src_id, target=dst_id, weight="weight")
-        path_iata = [G_full.nodes[n].get("iata", str(n)) for n in path]
-    except nx.NetworkXNoPath:
+    baseline_distance, path_pos = csr_shortest_path(A_full, src_pos, dst_pos)
+    if baseline_distance is None:
         raise HTTPException(400, f"No path found between {src_iata} and {dst_iata}")
+    path = node_ids[path_pos].tolist()
     
     # Lấy các transit nodes (bỏ src và dst)
     transit_ids = path[1:-1] if len(path) > 2 else []
-    transit_iata = [G_full.nodes[nid].get("iata", str(nid)) for nid in transit_ids]
+    transit_iata = _path_to_iata(transit_ids)
 
     # Xác định combo attack targets
     combo_targets_iata: List[str] = []
@@ -1142,15 +1068,13 @@ async def route_attack_simulation(
     # Map combo IATA -> node ids (chỉ lấy những node tồn tại trong graph)
     combo_targets_ids: List[int] = []
     for code in combo_targets_iata:
-        try:
-            nid = [n for n, d in G_full.nodes(data=True) if str(d.get("iata", "")).upper() == code]
-            if len(nid) > 0:
-                combo_targets_ids.append(int(nid[0]))
-        except Exception:
-            pass
+        nid = app_state.iata_index.get(code)
+        if nid is not None and nid in G_full:
+            combo_targets_ids.append(nid)
     
     # Chuẩn bị defended graph nếu cần
     G_def = None
+    A_def = None
     if with_defense:
         from app.metrics import get_lcc
         lcc_nodes = get_lcc(G_full)
@@ -1178,90 +1102,59 @@ async def route_attack_simulation(
         else:
             raise HTTPException(400, f"Unknown defense method: {defense_method}")
         
-        G_def = _ensure_edge_weights(G_def)
+        # TER/Schneider thêm hoặc đổi cạnh (chưa có weight) nên phải duyệt lại
+        G_def = ensure_edge_weights(G_def, force=True)
+        # Defended graph cũng được đưa về CSR (cùng không gian chỉ số node với graph gốc)
+        A_def = graph_to_csr(G_def, node_pos)
 
     # Nếu là kịch bản CFN và có combo targets, đảm bảo defended có ít nhất 1 đường dự phòng sau khi xoá combo
     if G_def and (src_iata.strip().upper() == "CFN" or dst_iata.strip().upper() == "CFN") and len(combo_targets_ids) >= 1:
         try:
             import math
-            from geopy.distance import great_circle
             CFN_CODE = "CFN"
             # Xác định id CFN theo đầu mút
             cfn_id = src_id if str(G_full.nodes[src_id].get("iata", "")).upper() == CFN_CODE else dst_id
             # Nếu sau khi xoá combo mà vẫn còn đường thì không cần ép thêm cạnh
-            G_check = G_def.copy()
-            G_check.remove_nodes_from(combo_targets_ids)
-            if not nx.has_path(G_check, src_id, dst_id):
+            # (kiểm tra trên CSR đã bỏ các node combo, không copy graph)
+            A_check = drop_from_csr(A_def, nodes=[node_pos[n] for n in combo_targets_ids])
+            _, labels = connected_components(A_check, directed=False, return_labels=True)
+            if labels[src_pos] != labels[dst_pos]:
                 # Tìm ứng viên gần nhất để nối CFN (không phải các node combo)
-                candidates = [n for n in G_def.nodes if n not in set(combo_targets_ids + [cfn_id])]
+                is_candidate = np.zeros(len(node_ids), dtype=bool)
+                is_candidate[[node_pos[n] for n in G_def.nodes]] = True
+                is_candidate[[node_pos[n] for n in combo_targets_ids + [cfn_id]]] = False
+                cfn_pos = node_pos[cfn_id]
+                dkm = great_circle_km(
+                    app_state.node_lat[cfn_pos], app_state.node_lon[cfn_pos],
+                    app_state.node_lat, app_state.node_lon,
+                )
+                dkm[~is_candidate | np.isnan(dkm)] = np.inf
                 best = None
                 best_dist = float('inf')
-                cfn_lat = G_def.nodes[cfn_id].get('lat'); cfn_lon = G_def.nodes[cfn_id].get('lon')
-                if cfn_lat is not None and cfn_lon is not None:
-                    for n in candidates:
-                        lat = G_def.nodes[n].get('lat'); lon = G_def.nodes[n].get('lon')
-                        if lat is None or lon is None:
-                            continue
-                        try:
-                            dkm = great_circle((cfn_lat, cfn_lon), (lat, lon)).kilometers
-                        except Exception:
-                            continue
-                        if dkm < best_dist:
-                            best = n; best_dist = dkm
+                if is_candidate.any():
+                    best_pos = int(np.argmin(dkm))
+                    best, best_dist = int(node_ids[best_pos]), float(dkm[best_pos])
                 # Nối cạnh dự phòng nếu tìm được ứng viên
                 if best is not None and math.isfinite(best_dist):
                     G_def.add_edge(cfn_id, best, distance_km=best_dist, weight=float(best_dist))
+                    A_def = graph_to_csr(G_def, node_pos)
         except Exception as _:
             pass
     
     # Hàm tính path length sau khi tấn công
-    def attack_and_measure(G, attack_node_ids):
-        G_attack = G.copy()
-        G_attack.remove_nodes_from(attack_node_ids)
-        try:
-            new_path = nx.shortest_path(G_attack, source=src_id, target=dst_id, weight="weight")
-            new_dist = nx.shortest_path_length(G_attack, source=src_id, target=dst_id, weight="weight")
-            new_path_iata = [G.nodes[n].get("iata", str(n)) for n in new_path]
-            return {
-                "connected": True,
-                "distance_km": new_dist,
-                "path_iata": new_path_iata,
-                "hops": len(new_path) - 1
-            }
-        except nx.NetworkXNoPath:
-            return {
-                "connected": False,
-                "distance_km": None,
-                "path_iata": [],
-                "hops": None
-            }
+    def attack_and_measure(A, attack_node_ids):
+        A_attack = drop_from_csr(A, nodes=[node_pos[n] for n in attack_node_ids])
+        new_dist, new_path = csr_shortest_path(A_attack, src_pos, dst_pos)
+        if new_dist is None:
+            return _disconnected_result()
+        return _route_result(new_dist, node_ids[new_path].tolist())
     
     # Baseline (không tấn công)
-    baseline_original = {
-        "connected": True,
-        "distance_km": baseline_distance,
-        "path_iata": path_iata,
-        "hops": len(path) - 1
-    }
+    baseline_original = _route_result(baseline_distance, path)
     
     baseline_defended = None
     if G_def:
-        try:
-            def_path = nx.shortest_path(G_def, source=src_id, target=dst_id, weight="weight")
-            def_dist = nx.shortest_path_length(G_def, source=src_id, target=dst_id, weight="weight")
-            baseline_defended = {
-                "connected": True,
-                "distance_km": def_dist,
-                "path_iata": [G_def.nodes[n].get("iata", str(n)) for n in def_path],
-                "hops": len(def_path) - 1
-            }
-        except nx.NetworkXNoPath:
-            baseline_defended = {
-                "connected": False,
-                "distance_km": None,
-                "path_iata": [],
-                "hops": None
-            }
+        baseline_defended = attack_and_measure(A_def, [])
     
     # Kết quả tấn công từng node
     attack_results = []
@@ -1277,10 +1170,10 @@ async def route_attack_simulation(
     
     # Scenario 1..N: Tấn công từng transit node
     for transit_id, transit_code in zip(transit_ids, transit_iata):
-        orig_result = attack_and_measure(G_full, [transit_id])
+        orig_result = attack_and_measure(A_full, [transit_id])
         def_result = None
         if G_def:
-            def_result = attack_and_measure(G_def, [transit_id])
+            def_result = attack_and_measure(A_def, [transit_id])
         
         attack_results.append({
             "scenario": f"Remove {transit_code}",
@@ -1292,10 +1185,10 @@ async def route_attack_simulation(
     
     # Scenario Combo: sử dụng danh sách combo được chọn (ưu tiên tham số hoặc CFN => DUB+GLA)
     if len(combo_targets_ids) >= 1:
-        orig_result = attack_and_measure(G_full, combo_targets_ids)
+        orig_result = attack_and_measure(A_full, combo_targets_ids)
         def_result = None
         if G_def:
-            def_result = attack_and_measure(G_def, combo_targets_ids)
+            def_result = attack_and_measure(A_def, combo_targets_ids)
         combo_label = f"Combo: {', '.join(combo_targets_iata)}" if combo_targets_iata else "Combo"
         attack_results.append({
             "scenario": combo_label,
@@ -1,9 +1,51 @@
 """Application state"""
+import logging
+import math
 import networkx as nx
-from typing import Optional, Set, Tuple
+import numpy as np
+from scipy.sparse import csr_array
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.arrays import drop_from_csr, graph_to_csr
+from app.loader import ensure_edge_weights
+
+logger = logging.getLogger(__name__)
+
+
+def _finite_or_none(value) -> Optional[float]:
+    """Float value, or None for missing/NaN/inf (keeps JSON output valid)."""
+    if isinstance(value, (int, float)) and math.isfinite(value):
+        return float(value)
+    return None
+
+
+def _norm_edge(a: int, b: int) -> Tuple[int, int]:
+    """Undirected edge key (min, max), without the list + sort of tuple(sorted(...))."""
+    return (a, b) if a < b else (b, a)
+
+
+def _as_text(value) -> str:
+    """Text fields may be NaN (float) -> safe string or empty."""
+    if isinstance(value, str):
+        return value
+    return "" if value is None else str(value)
 
 
 class AppState:
+    # Single module-level instance read by every route: no per-instance __dict__
+    __slots__ = (
+        "graph_undirected", "graph_directed",
+        "removed_nodes_undirected", "removed_edges_undirected",
+        "removed_nodes_directed", "removed_edges_directed",
+        "graph", "removed_nodes", "removed_edges",
+        "graph_version",
+        "node_ids", "node_id_to_idx", "node_lat", "node_lon", "node_iata", "iata_index",
+        "csr", "incident_edges", "removed_node_mask",
+        "precomputed",
+        "node_lat_exact", "node_lon_exact",
+        "out_lat", "out_lon", "out_name", "out_city", "out_country", "out_iata",
+    )
+
     def __init__(self):
         # Base graphs (loaded at startup)
         self.graph_undirected: Optional[nx.Graph] = None
@@ -21,80 +63,236 @@ class AppState:
         self.removed_nodes: Set[int] = self.removed_nodes_undirected
         self.removed_edges: Set[Tuple[int, int]] = self.removed_edges_undirected
 
+        # Monotonic counter bumped on every load/removal/restore/reset; caches key on it
+        self.graph_version: int = 0
+
+        # Array (SoA) form of the undirected base graph, built once at load
+        self.node_ids: Optional[np.ndarray] = None
+        self.node_id_to_idx: Dict[int, int] = {}
+        self.node_lat: Optional[np.ndarray] = None
+        self.node_lon: Optional[np.ndarray] = None
+        self.node_iata: Optional[np.ndarray] = None
+        self.iata_index: Dict[str, int] = {}
+        self.csr: Optional[csr_array] = None
+        # node id -> its incident edges as normalised (min, max) keys, so remove/restore is one set op
+        self.incident_edges: Dict[int, frozenset] = {}
+        # removed_nodes (undirected) as a bool array over node positions, kept in step by remove/restore/reset
+        self.removed_node_mask: Optional[np.ndarray] = None
+
+        # Pre-computed attack-impact results by region key (see app.precomputed), loaded at startup
+        self.precomputed: Dict[str, dict] = {}
+
+        # Per-node API output fields, normalised once at load (NaN/inf -> None, non-str -> str)
+        self.node_lat_exact: Optional[np.ndarray] = None
+        self.node_lon_exact: Optional[np.ndarray] = None
+        self.out_lat: List[Optional[float]] = []
+        self.out_lon: List[Optional[float]] = []
+        self.out_name: List[str] = []
+        self.out_city: List[str] = []
+        self.out_country: List[str] = []
+        self.out_iata: List[str] = []
+
+    def build_graph_arrays(self) -> None:
+        """
+        Build the array form of the base graph: node id <-> index maps, coordinates,
+        IATA codes (plus an upper-cased IATA -> id index) and a symmetric CSR
+        adjacency weighted in km.
+        """
+        G = self.graph_undirected
+        if G is None:
+            return
+        # Attach km 'weight' to every edge now, while nothing else reads the graph
+        # (shortest-path routes rely on it; requests never write to the base graph)
+        ensure_edge_weights(G)
+        n = len(G)
+        self.node_ids = np.fromiter(G.nodes(), dtype=np.int64, count=n)
+        self.node_id_to_idx = {node_id: i for i, node_id in enumerate(G.nodes())}
+        # float64 for bbox masks and output, so filtering matches filter_graph_by_bbox exactly
+        self.node_lat_exact = np.fromiter((d.get("lat", np.nan) for _, d in G.nodes(data=True)), dtype=np.float64, count=n)
+        self.node_lon_exact = np.fromiter((d.get("lon", np.nan) for _, d in G.nodes(data=True)), dtype=np.float64, count=n)
+        # float32 copies of the same values halve the bandwidth of vectorised distance passes (~1 m resolution)
+        self.node_lat = self.node_lat_exact.astype(np.float32)
+        self.node_lon = self.node_lon_exact.astype(np.float32)
+        node_iata = np.empty(n, dtype=object)
+        node_iata[:] = [d.get("iata", str(node_id)) for node_id, d in G.nodes(data=True)]
+        self.node_iata = node_iata
+
+        self.out_lat = [_finite_or_none(d.get("lat")) for _, d in G.nodes(data=True)]
+        self.out_lon = [_finite_or_none(d.get("lon")) for _, d in G.nodes(data=True)]
+        self.out_name = [_as_text(d.get("name", "")) for _, d in G.nodes(data=True)]
+        self.out_city = [_as_text(d.get("city", "")) for _, d in G.nodes(data=True)]
+        self.out_country = [_as_text(d.get("country", "")) for _, d in G.nodes(data=True)]
+        self.out_iata = [_as_text(d.get("iata", "")) for _, d in G.nodes(data=True)]
+
+        # Same normalisation as the old per-request scan (str().upper()); first node wins on duplicates
+        self.iata_index = {}
+        for node_id, code in zip(self.node_ids.tolist(), node_iata):
+            if code:
+                self.iata_index.setdefault(str(code).upper(), node_id)
+
+        # Edge weights stay float64: scipy.sparse.csgraph casts to float64 on every call,
+        # so a float32 CSR would add a conversion to each Dijkstra run.
+        adj = G._adj
+        self.incident_edges = {
+            node_id: frozenset((node_id, nbr) if node_id < nbr else (nbr, node_id) for nbr in adj[node_id])
+            for node_id in adj
+        }
+
+        node_id_to_idx = self.node_id_to_idx
+        self.removed_node_mask = np.zeros(n, dtype=bool)
+        if self.removed_nodes_undirected:
+            self.removed_node_mask[[node_id_to_idx[node] for node in self.removed_nodes_undirected if node in node_id_to_idx]] = True
+
+        self.csr = graph_to_csr(G, node_id_to_idx)
+        self.graph_version += 1
+
+    def get_active_csr(self) -> Optional[csr_array]:
+        """CSR adjacency of the undirected graph with removed nodes/edges dropped."""
+        if self.csr is None:
+            return None
+        if not self.removed_nodes and not self.removed_edges:
+            return self.csr
+        idx = self.node_id_to_idx
+        return drop_from_csr(
+            self.csr,
+            nodes=np.flatnonzero(self.removed_node_mask),
+            edges=[(idx[u], idx[v]) for u, v in self.removed_edges if u in idx and v in idx],
+        )
+
+    def active_node_mask(self) -> np.ndarray:
+        """Boolean mask over node positions: True for nodes not removed (undirected mode)."""
+        return ~self.removed_node_mask
+
     def get_base_graph(self, mode: str = "undirected") -> Optional[nx.Graph]:
         if mode == "directed":
             return self.graph_directed
         return self.graph_undirected
 
     def get_active_graph(self, mode: str = "undirected") -> Optional[nx.Graph]:
-        """Get graph with removed nodes/edges excluded for a given mode."""
+        """
+        Read-only view of the graph with removed nodes/edges hidden for a given mode.
+
+        No adjacency copy is made: the view filters the base graph lazily against a
+        snapshot of the removal sets. Callers that mutate the result must .copy() it.
+        """
         base = self.get_base_graph(mode)
         if base is None:
             return None
 
-        G = base.copy()
+        if mode == "directed":
+            has_removals = bool(self.removed_nodes_directed or self.removed_edges_directed)
+        else:
+            has_removals = bool(self.removed_nodes_undirected or self.removed_edges_undirected)
+        if not has_removals:
+            # Nothing hidden: an unfiltered (frozen) view skips the per-node/edge filter calls
+            return nx.freeze(nx.graphviews.generic_graph_view(base))
 
         if mode == "directed":
-            G.remove_nodes_from(self.removed_nodes_directed)
+            removed_nodes = frozenset(self.removed_nodes_directed)
             # directed edges are stored as (src, dst) exactly
-            G.remove_edges_from(self.removed_edges_directed)
-            return G
+            removed_edges = frozenset(self.removed_edges_directed)
+
+            def filter_edge(u, v):
+                return (u, v) not in removed_edges
+        else:
+            # undirected mode (default): edges are stored normalised as (min, max)
+            removed_nodes = frozenset(self.removed_nodes_undirected)
+            removed_edges = frozenset(self.removed_edges_undirected)
+
+            def filter_edge(u, v):
+                return ((u, v) if u < v else (v, u)) not in removed_edges
+
+        def filter_node(n):
+            return n not in removed_nodes
 
-        # undirected mode (default)
-        G.remove_nodes_from(self.removed_nodes_undirected)
-        G.remove_edges_from(self.removed_edges_undirected)
-        return G
+        return nx.subgraph_view(base, filter_node=filter_node, filter_edge=filter_edge)
     
+    def materialize_active_graph(self, nodes: Optional[Set[int]] = None) -> Optional[nx.Graph]:
+        """
+        Mutable copy of the active undirected graph, optionally restricted to `nodes`.
+
+        Built in one pass (kept nodes, then kept edges) rather than copy() followed by
+        remove_edges_from; node and adjacency order match base.subgraph(nodes).copy().
+        """
+        base = self.graph_undirected
+        if base is None:
+            return None
+        src = base if nodes is None else base.subgraph(nodes)
+        removed_nodes = self.removed_nodes_undirected
+        removed_edges = self.removed_edges_undirected
+
+        H = base.__class__()
+        H.graph.update(base.graph)
+        H.add_nodes_from((n, d.copy()) for n, d in src._node.items() if n not in removed_nodes)
+        H.add_edges_from(
+            (u, v, d.copy())
+            for u, nbrs in src._adj.items() if u not in removed_nodes
+            for v, d in nbrs.items()
+            if v not in removed_nodes and ((u, v) if u < v else (v, u)) not in removed_edges
+        )
+        return H
+
     def remove_node(self, node_id: int) -> bool:
         """Remove a node and all its connected edges"""
-        if self.graph is None or node_id not in self.graph:
+        G = self.graph
+        if G is None or node_id not in G:
             return False
         self.removed_nodes.add(node_id)
-        # Also remove all edges connected to this node
-        if node_id in self.graph:
-            neighbors = list(self.graph.neighbors(node_id))
-            for neighbor in neighbors:
-                edge = tuple(sorted([node_id, neighbor]))
-                self.removed_edges.add(edge)
+        self.removed_node_mask[self.node_id_to_idx[node_id]] = True
+        # Also remove all edges connected to this node (in place: removed_edges is aliased)
+        self.removed_edges |= self.incident_edges[node_id]
+        self.graph_version += 1
         return True
     
     def restore_node(self, node_id: int) -> bool:
         """Restore a node and all its connected edges"""
         if node_id in self.removed_nodes:
             self.removed_nodes.remove(node_id)
+            idx = self.node_id_to_idx
+            if node_id in idx:
+                self.removed_node_mask[idx[node_id]] = False
             # Also restore all edges connected to this node
-            if self.graph and node_id in self.graph:
-                neighbors = list(self.graph.neighbors(node_id))
-                for neighbor in neighbors:
-                    edge = tuple(sorted([node_id, neighbor]))
-                    if edge in self.removed_edges:
-                        self.removed_edges.remove(edge)
+            incident = self.incident_edges.get(node_id)
+            if incident:
+                self.removed_edges -= incident
+            self.graph_version += 1
             return True
         return False
     
     def remove_edge(self, src: int, dst: int) -> bool:
         """Remove an edge"""
-        if self.graph is None:
+        G = self.graph
+        if G is None:
             return False
         # Normalize edge (undirected graph)
-        edge = tuple(sorted([src, dst]))
-        if edge[0] in self.graph and edge[1] in self.graph and self.graph.has_edge(edge[0], edge[1]):
+        edge = _norm_edge(src, dst)
+        adj = G._adj
+        if edge[0] in adj and edge[1] in adj[edge[0]]:
             self.removed_edges.add(edge)
+            self.graph_version += 1
             return True
         return False
     
     def restore_edge(self, src: int, dst: int) -> bool:
         """Restore an edge"""
-        edge = tuple(sorted([src, dst]))
+        edge = _norm_edge(src, dst)
         if edge in self.removed_edges:
             self.removed_edges.remove(edge)
+            self.graph_version += 1
             return True
         return False
     
     def reset(self):
-        """Reset all removals"""
-        self.removed_nodes.clear()
-        self.removed_edges.clear()
+        """Reset all removals (no-op when nothing is removed, so cached results stay valid)"""
+        if not self.removed_nodes and not self.removed_edges:
+            return
+        # Fresh containers instead of clearing in place; the undirected names and their
+        # backward-compat aliases are rebound together
+        self.removed_nodes_undirected = self.removed_nodes = set()
+        self.removed_edges_undirected = self.removed_edges = set()
+        if self.removed_node_mask is not None:
+            self.removed_node_mask = np.zeros_like(self.removed_node_mask)
+        self.graph_version += 1
 
 
 app_state = AppState()
@@ -106,7 +304,7 @@ def load_data_on_startup():
     """Load data files from the OpenFlights folder next to the project root."""
     import os
     from pathlib import Path
-    from app.loader import load_and_build_graph
+    from app.loader import load_graph_cached
 
     # Resolve project root: backend/app/state.py -> backend -> project root
     current_file = Path(__file__).resolve()
@@ -119,9 +317,7 @@ def load_data_on_startup():
         project_root.parent / "openflights" / "data",
     ]
 
-    print("Trying to load OpenFlights data from:")
-    for d in candidate_dirs:
-        print(f"  - {d}")
+    logger.info("Trying to load OpenFlights data from: %s", ", ".join(str(d) for d in candidate_dirs))
 
     for data_dir in candidate_dirs:
         airports_path = data_dir / "airports.dat"
@@ -129,20 +325,39 @@ def load_data_on_startup():
 
         if airports_path.exists() and routes_path.exists():
             try:
-                app_state.graph_undirected = load_and_build_graph(
+                app_state.graph_undirected = load_graph_cached(
                     str(airports_path),
                     str(routes_path),
                 )
                 # keep backward-compat alias
                 app_state.graph = app_state.graph_undirected
-                print(
-                    f"Loaded graph from {data_dir}: "
-                    f"{len(app_state.graph_undirected)} nodes, "
-                    f"{app_state.graph_undirected.number_of_edges()} edges"
+                app_state.build_graph_arrays()
+                # Compile the optional numba kernels now rather than on the first request
+                from app.kernels import warm_up
+                warm_up()
+                logger.info(
+                    "Loaded graph from %s: %d nodes, %d edges",
+                    data_dir,
+                    len(app_state.graph_undirected),
+                    app_state.graph_undirected.number_of_edges(),
                 )
                 return
             except Exception as e:
-                print(f"Error loading from {data_dir}: {e}")
+                logger.warning("Error loading from %s: %s", data_dir, e)
 
-    print("Warning: Could not load data files (airports.dat, routes.dat)")
+    logger.warning("Could not load data files (airports.dat, routes.dat)")
+
+
+
+def load_precomputed_on_startup():
+    """Load the pre-computed attack results from backend/ once into app_state.precomputed (empty if missing)."""
+    from pathlib import Path
+    from app.precomputed import load_all
 
+    try:
+        app_state.precomputed = load_all(str(Path(__file__).resolve().parent.parent))
+        if app_state.precomputed:
+            logger.info("Loaded pre-computed attack data for: %s", ", ".join(app_state.precomputed))
+    except Exception as e:
+        app_state.precomputed = {}
+        logger.warning("Error loading pre-computed data: %s", e)
@@ -1,16 +1,21 @@
 """Pre-compute attack analysis results for all regions"""
-import json
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from app.state import app_state
-from app.loader import load_and_build_graph
-from app.filter import filter_graph_by_bbox
-from app.attacks import simulate_attack
-from app.metrics import get_stats
+from app.loader import load_graph_cached
+import numpy as np
+
+from app.filter import bbox_mask, filter_graph_by_bbox
+from app.arrays import masked_lcc_stats
+from app.attacks import random_attack, degree_targeted_attack, betweenness_targeted_attack
+from app.precomputed import INDEX_FILE, save_index, save_region
+
+OUTPUT_DIR = "."
 
 # Define regions
 REGIONS = {
@@ -32,6 +37,41 @@ REGIONS = {
     }
 }
 
+def csr_stats(active: np.ndarray) -> dict:
+    """
+    Stats of the subgraph induced by the active node positions, via the CSR built at load,
+    in the shape precomputed_attacks.json has always used (hop diameter as int, ASPL on the LCC).
+    """
+    stats = masked_lcc_stats(app_state.csr.indptr, app_state.csr.indices, active, with_aspl=True)
+    return {
+        "nodes": stats["nodes"],
+        "edges": stats["edges"],
+        "lcc_norm": stats["lcc_size"] / stats["nodes"] if stats["nodes"] else 0.0,
+        "diameter": int(stats["diameter"]),
+        "aspl": stats["aspl"],
+        "components": stats["components"],
+    }
+
+def attack_curve(region_mask: np.ndarray, order: list, k: int) -> list:
+    """
+    Stats after removing order[:s] for s = 0..k, on the CSR adjacency built at load.
+    The region is a boolean mask over node positions; removing a node clears its bit.
+    """
+    idx = app_state.node_id_to_idx
+    active = region_mask.copy()
+    n0 = int(active.sum())
+    curve = []
+    for step in range(min(k, len(order)) + 1):
+        if step > 0:
+            active[idx[order[step - 1]]] = False
+        stats = csr_stats(active)
+        point = {"step": step, "removed": step}
+        if step > 0:
+            point["fraction_removed"] = step / n0
+        point.update(stats)
+        curve.append(point)
+    return curve
+
 def precompute_region(region_key: str, region_data: dict, k: int = 5):
     """Pre-compute attack analysis for a region"""
     print(f"\n=== Pre-computing {region_data['name']} ===")
@@ -41,15 +81,22 @@ def precompute_region(region_key: str, region_data: dict, k: int = 5):
     if bbox:
         G = filter_graph_by_bbox(app_state.graph, bbox)
     else:
-        G = app_state.graph.copy()
-    
-    if len(G) == 0:
+        # No copy: the attack orderings copy internally or only read G, and the
+        # curves remove nodes from a mask, never from the graph
+        G = app_state.graph
+    
+    # Counted once: number_of_edges() walks every node's adjacency
+    n_nodes = len(G)
+    n_edges = G.number_of_edges()
+    if n_nodes == 0:
         print(f"  No nodes in region, skipping...")
         return None
     
-    print(f"  Graph size: {len(G)} nodes, {G.number_of_edges()} edges")
+    print(f"  Graph size: {n_nodes} nodes, {n_edges} edges")
+    region_mask = bbox_mask(app_state.node_lat_exact, app_state.node_lon_exact, bbox)
     
-    baseline = get_stats(G)
+    # get_stats-style metrics, but BFS runs in scipy's csgraph
+    baseline = csr_stats(region_mask)
     print(f"  Baseline: LCC={baseline['lcc_norm']:.3f}, ASPL={baseline['aspl']:.2f}")
     
     results = {
@@ -62,7 +109,7 @@ def precompute_region(region_key: str, region_data: dict, k: int = 5):
     # Random attack
     print(f"  Computing random attack...")
     try:
-        random_curve = simulate_attack(G, "random", k, seed=42)
+        random_curve = attack_curve(region_mask, random_attack(G, k, seed=42), k)
         results['random'] = random_curve
         print(f"    OK Random: {len(random_curve)} points")
     except Exception as e:
@@ -72,7 +119,7 @@ def precompute_region(region_key: str, region_data: dict, k: int = 5):
     # Degree attack
     print(f"  Computing degree attack...")
     try:
-        degree_curve = simulate_attack(G, "degree", k, adaptive=True)
+        degree_curve = attack_curve(region_mask, degree_targeted_attack(G, k, adaptive=True), k)
         results['degree'] = degree_curve
         print(f"    OK Degree: {len(degree_curve)} points")
     except Exception as e:
@@ -81,65 +128,83 @@ def precompute_region(region_key: str, region_data: dict, k: int = 5):
     
     # Betweenness attack (only for small graphs)
     results['betweenness'] = []
-    if len(G) <= 50:
+    if n_nodes <= 50:
         print(f"  Computing betweenness attack...")
         try:
-            betweenness_curve = simulate_attack(G, "betweenness", k, adaptive=True)
+            betweenness_curve = attack_curve(region_mask, betweenness_targeted_attack(G, k, adaptive=True), k)
             results['betweenness'] = betweenness_curve
             print(f"    OK Betweenness: {len(betweenness_curve)} points")
         except Exception as e:
             print(f"    ERROR Betweenness failed: {e}")
     else:
-        print(f"  Skipping betweenness (graph too large: {len(G)} nodes)")
+        print(f"  Skipping betweenness (graph too large: {n_nodes} nodes)")
     
     return results
 
+def precompute_and_save(region_key: str, region_data: dict, k: int = 5):
+    """Worker task: compute a region and write its .npz right away; only the small index entry goes back."""
+    result = precompute_region(region_key, region_data, k)
+    if not result:
+        return None
+    return save_region(OUTPUT_DIR, result)
+
+def load_graph(airports_path: str, routes_path: str):
+    """Build the graph (and its CSR arrays) into this process's app_state; pool worker initializer."""
+    app_state.graph = load_graph_cached(airports_path, routes_path)
+    app_state.graph_undirected = app_state.graph
+    # CSR adjacency + per-node coordinate arrays, built once and shared by every region of this process
+    app_state.build_graph_arrays()
+    print(f"✓ Loaded graph: {len(app_state.graph)} nodes, {app_state.graph.number_of_edges()} edges")
+
 def main():
     """Main pre-computation function"""
     print("Loading graph...")
     
-    # Try to load graph
+    # Locate the data files
     paths = [
         "../openflights/data",
         "openflights/data",
         "../../openflights/data"
     ]
     
+    data_paths = None
     for base_path in paths:
         airports_path = os.path.join(base_path, "airports.dat")
         routes_path = os.path.join(base_path, "routes.dat")
         
         if os.path.exists(airports_path) and os.path.exists(routes_path):
-            try:
-                app_state.graph = load_and_build_graph(airports_path, routes_path)
-                print(f"✓ Loaded graph: {len(app_state.graph)} nodes, {app_state.graph.number_of_edges()} edges")
-                break
-            except Exception as e:
-                print(f"Error loading from {base_path}: {e}")
+            data_paths = (airports_path, routes_path)
+            break
     
-    if app_state.graph is None:
+    if data_paths is None:
         print("ERROR: Could not load graph!")
         return
     
-    # Pre-compute for each region
-    all_results = {}
-    
-    for region_key, region_data in REGIONS.items():
-        try:
-            result = precompute_region(region_key, region_data, k=5)
-            if result:
-                all_results[region_key] = result
-        except Exception as e:
-            print(f"ERROR computing {region_key}: {e}")
-            continue
+    # Pre-compute regions in parallel: each worker loads its own graph once (initializer),
+    # so nothing large is pickled and no app_state is shared between processes
+    index = {}
+    workers = min(len(REGIONS), os.cpu_count() or 1)
+    
+    with ProcessPoolExecutor(max_workers=workers, initializer=load_graph, initargs=data_paths) as ex:
+        futures = {
+            ex.submit(precompute_and_save, region_key, region_data, 5): region_key
+            for region_key, region_data in REGIONS.items()
+        }
+        for future in as_completed(futures):
+            region_key = futures[future]
+            try:
+                # Curves are already on disk (one .npz per region); keep only the index entry
+                entry = future.result()
+                if entry:
+                    index[region_key] = entry
+            except Exception as e:
+                print(f"ERROR computing {region_key}: {e}")
     
-    # Save to file
-    output_file = "precomputed_attacks.json"
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(all_results, f, indent=2, ensure_ascii=False)
+    # Index keeps the REGIONS order regardless of completion order
+    save_index(OUTPUT_DIR, {key: index[key] for key in REGIONS if key in index})
     
-    print(f"\nSaved results to {output_file}")
-    print(f"  Regions computed: {len(all_results)}")
+    print(f"\nSaved results to {os.path.join(OUTPUT_DIR, INDEX_FILE)} (+ {len(index)} .npz files)")
+    print(f"  Regions computed: {len(index)}")
 
 if __name__ == "__main__":
     main()